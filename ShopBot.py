@@ -4,8 +4,34 @@ from discord.ext import commands
 from discord import app_commands
 import json
 import os
-from collections import Counter
+import hashlib
+import tempfile
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
 import asyncio
+import abc
+import contextlib
+import contextvars
+import functools
+import itertools
+import math
+import time
+import io
+import datetime
+import gzip
+import html
+import bisect
+import heapq
+import collections
+import csv
+import logging
+import re
+import aiohttp
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from aiohttp import web
+from typing import Literal
+from concurrent.futures import ThreadPoolExecutor
 
 intents = discord.Intents.default()
 intents.guilds = True
@@ -13,16 +39,150 @@ intents.messages = True
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
 
-user_carts = {}
+
+class ShopBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Bring back carts, shop channels and receipts from before the restart,
+        # and re-attach handlers to the buttons already posted in Discord.
+        carts, tickets, receipts = await storage.run(session_store.load)
+        user_carts.update(carts)
+        user_tickets.update(tickets)
+        ticket_receipts.update(receipts)
+        for server in {cart.server for cart in carts.values() if cart.server}:
+            await storage.load(server)  # only servers with open carts are loaded up front
+
+        self.add_view(ServerSelectView(user_id=0))
+        self.add_dynamic_items(
+            ViewItemsButton, ViewCartButton, ConfirmOrderButton, BackToHomeButton, CategoryButton,
+            CatalogPageButton, CatalogJumpButton, CatalogAddToCartSelect, CloseTicketButton
+        )
+        print(f"✅ Restored {len(carts)} carts, {len(tickets)} shop channels, {len(receipts)} receipts")
+        self.image_validator = asyncio.create_task(image_cache.validate_forever())
+        self.inventory_reaper = asyncio.create_task(inventory_reaper())
+        self.session_reaper = asyncio.create_task(session_reaper())
+        inventory_events.start(asyncio.get_running_loop())
+        if shared_state.shared:
+            self.change_follower = asyncio.create_task(follow_changes())
+        if METRICS_PORT:
+            await metrics.serve(METRICS_HOST, METRICS_PORT)
+
+    async def close(self):
+        await image_cache.close()
+        await metrics.close()
+        await super().close()
+
+
+class SessionMap(collections.OrderedDict):
+    """Per-shopper state ordered by last use, least recently used first.
+
+    Writes and touch() count as use. session_reaper() walks the front of the
+    map to expire what has been idle too long and to hold it under a size cap.
+    The cap is soft: a session whose shop channel is still open and in use
+    survives it (its cart is emptied but keeps the server), so with more live
+    shop channels than the cap the maps grow past it, bounded by the number
+    of open channels instead.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.used = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.touch(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.used.pop(key, None)
+
+    def pop(self, key, *default):
+        self.used.pop(key, None)
+        return super().pop(key, *default)
+
+    def touch(self, key):
+        if key in self:
+            self.move_to_end(key)
+            self.used[key] = time.time()
+
+    def idle(self, max_idle: float, max_size: int = 0) -> list:
+        """Keys idle for longer than max_idle, plus the oldest ones beyond max_size."""
+        cutoff, excess = time.time() - max_idle, len(self) - max_size if max_size else 0
+        keys = []
+        for key in self:
+            if self.used.get(key, 0) > cutoff and len(keys) >= excess:
+                break
+            keys.append(key)
+        return keys
+
+
+# Carts, shop channels and stock holds are per shopper per guild: (guild_id, user_id).
+user_carts = SessionMap()
 ticket_receipts = {}
-user_tickets = {}  # Track existing ticket channels per user
+user_tickets = SessionMap()  # Track existing ticket channels per (guild, user)
 
-SERVER_FILES = {
-    '2b2t': '2b2t_inventory.json',
-    'constantiam': 'constantiam_inventory.json'
+# Seeds the server registry on first start; after that servers are managed with /server.
+DEFAULT_SERVERS = {
+    '2b2t': ('2b2t', '2b2t_inventory.json'),
+    'constantiam': ('Constantiam', 'constantiam_inventory.json')
 }
+SERVER_FILES = {}  # name -> inventory file, kept in sync by server_registry
+
+# "json" keeps the inventory in SERVER_FILES, "sqlite" moves it into INVENTORY_DB
+# (the JSON files are imported once, the first time a server is seen).
+INVENTORY_BACKEND = os.getenv("SHOP_INVENTORY_BACKEND", "json").lower()
+INVENTORY_DB = os.getenv("SHOP_INVENTORY_DB", "inventory.db")
+JOURNAL_COMPACT_RECORDS = int(os.getenv("SHOP_JOURNAL_COMPACT_RECORDS", "256"))
+SESSION_DB = os.getenv("SHOP_SESSION_DB", "shop_state.db")
+LEDGER_DB = os.getenv("SHOP_LEDGER_DB", "orders.db")
+# "sqlite" lets several bot processes share SESSION_DB: stock changes take a cross-process
+# lock and every process hears about the others' changes within STATE_POLL_INTERVAL seconds.
+STATE_BACKEND = os.getenv("SHOP_STATE_BACKEND", "local").lower()
+STATE_POLL_INTERVAL = float(os.getenv("SHOP_STATE_POLL_INTERVAL", "1"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SHOP_SQLITE_BUSY_TIMEOUT", "30"))  # seconds a write waits on another connection
+STARTUP_CONCURRENCY = int(os.getenv("SHOP_STARTUP_CONCURRENCY", "5"))  # guilds set up at once per shard
+STORAGE_WORKERS = int(os.getenv("SHOP_STORAGE_WORKERS", "4"))
+RESERVATION_TTL = int(os.getenv("SHOP_RESERVATION_TTL", "900"))  # seconds an Add to Cart holds stock
+# seconds before an unused inventory is dropped (SHOP_SHARD_IDLE_TTL is the old name)
+INVENTORY_IDLE_TTL = int(os.getenv("SHOP_INVENTORY_IDLE_TTL", os.getenv("SHOP_SHARD_IDLE_TTL", "1800")))
+IMAGE_CACHE_DIR = os.getenv("SHOP_IMAGE_CACHE_DIR", "image_cache")
+IMAGE_FETCH_CONCURRENCY = int(os.getenv("SHOP_IMAGE_FETCH_CONCURRENCY", "4"))
+IMAGE_VALIDATE_INTERVAL = int(os.getenv("SHOP_IMAGE_VALIDATE_INTERVAL", "21600"))  # seconds between sweeps
+TRANSCRIPT_FORMAT = os.getenv("SHOP_TRANSCRIPT_FORMAT", "txt").lower()  # txt, html or jsonl
+TRANSCRIPT_GZIP = os.getenv("SHOP_TRANSCRIPT_GZIP", "0") == "1"
+METRICS_PORT = int(os.getenv("SHOP_METRICS_PORT", "0"))  # 0 keeps the Prometheus endpoint off
+METRICS_HOST = os.getenv("SHOP_METRICS_HOST", "127.0.0.1")
+CART_IDLE_TTL = int(os.getenv("SHOP_CART_IDLE_TTL", "21600"))  # seconds before an untouched cart is emptied
+SHOP_CHANNEL_IDLE_TTL = int(os.getenv("SHOP_CHANNEL_IDLE_TTL", "86400"))  # seconds before an abandoned shop channel goes
+SESSION_MAX = int(os.getenv("SHOP_SESSION_MAX", "50000"))  # carts/shop channels kept in memory at most
+REAPER_INTERVAL = int(os.getenv("SHOP_REAPER_INTERVAL", "300"))
+REAPER_BATCH = int(os.getenv("SHOP_REAPER_BATCH", "10"))  # shop channels closed per sweep
+TICKET_MODE = os.getenv("SHOP_TICKET_MODE", "channel").lower()  # channel, or thread: private threads in TICKET_THREAD_PARENT
+TICKET_THREAD_PARENT = os.getenv("SHOP_TICKET_THREAD_PARENT", "shop")
+TICKET_POOL_SIZE = int(os.getenv("SHOP_TICKET_POOL_SIZE", "2"))  # hidden channels kept ready per guild
+CATALOG_REFRESH_DELAY = float(os.getenv("SHOP_CATALOG_REFRESH_DELAY", "2"))  # seconds stock changes gather before an edit
+LIVE_CATALOG_TTL = int(os.getenv("SHOP_LIVE_CATALOG_TTL", "1800"))  # seconds a catalog message stays live after paging
+SHARD_COUNT = int(os.getenv("SHOP_SHARD_COUNT", "0")) or None  # 0 uses Discord's recommended count
+SHARD_IDS = [int(i) for i in os.getenv("SHOP_SHARD_IDS", "").split(",") if i.strip()] or None  # this process's shards
+
+bot = ShopBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+
+def shard_of(guild_id) -> int:
+    """The shard a guild's events arrive on; 0 outside a guild."""
+    if not guild_id:
+        return 0
+    return (guild_id >> 22) % (bot.shard_count or 1)
+
+
+def channel_shard(channel) -> int:
+    guild = getattr(channel, "guild", None)
+    return shard_of(guild.id) if guild is not None else 0
+
+
+def session_key(interaction: discord.Interaction, user_id: int = None) -> tuple:
+    """The (guild_id, user_id) key of the shopper behind an interaction."""
+    return interaction.guild_id, interaction.user.id if user_id is None else user_id
 
 CATEGORY_COLORS = {
     'electronics': discord.ButtonStyle.primary,
@@ -34,6 +194,228 @@ CATEGORY_COLORS = {
 
 
 
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket it falls in."""
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = METRICS_BUCKETS[i - 1] if i else 0.0
+                upper = METRICS_BUCKETS[i] if i < len(METRICS_BUCKETS) else lower * 2
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return 0.0
+
+
+class Metrics:
+    """In-process counters, histograms and gauges, shown by /stats and the Prometheus endpoint.
+
+    Series are keyed by metric name plus a sorted tuple of label pairs. Storage
+    worker threads record into it too, hence the lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+        self.runner = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name: str, func, label: str = None):
+        """func() returns a number, or with a label a {label value: number} dict."""
+        self.gauges[name] = (func, label)
+
+    def read_gauges(self, labelled: bool = False) -> dict:
+        return {name: func() for name, (func, label) in self.gauges.items() if bool(label) == labelled}
+
+    def counter(self, name: str, **labels) -> float:
+        """Sum of a counter over every series whose labels include the given ones."""
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(v for (n, l), v in self.counters.items() if n == name and wanted <= set(l))
+
+    def by_label(self, name: str, label: str, histograms: bool = False) -> dict:
+        """One metric's counters (or merged histograms) keyed by the value of one label."""
+        with self.lock:
+            source = self.histograms if histograms else self.counters
+            result = {}
+            for (n, labels), value in source.items():
+                if n != name:
+                    continue
+                key = dict(labels).get(label, "")
+                if not histograms:
+                    result[key] = result.get(key, 0) + value
+                    continue
+                if key not in result:
+                    result[key] = Histogram()
+                result[key].merge(value)
+            return result
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines, typed = [], set()
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda kv: kv[0])
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in histograms]
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{fmt(labels)} {value}")
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip(METRICS_BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{fmt(labels)} {total}")
+            lines.append(f"{name}_count{fmt(labels)} {count}")
+        for name, (func, label) in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            if label is None:
+                lines.append(f"{name} {func()}")
+                continue
+            for value, number in sorted(func().items()):
+                if math.isfinite(number):
+                    lines.append(f"{name}{fmt([(label, value)])} {number}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str, port: int):
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        print(f"📈 Metrics on http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+metrics = Metrics()
+
+
+_current_handler = contextvars.ContextVar("_current_handler", default=None)
+
+
+def instrumented(func, name: str = None):
+    """Record latency and errors of an async handler under shop_handler_seconds{handler=name,shard=...}.
+
+    A handler called from another one (picked() from PickerSelect.callback) is
+    not recorded separately: the interaction counts once, under the inner name.
+    """
+    name = name or func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        outer = _current_handler.get()
+        if outer is not None:
+            outer[0] = name
+            return await func(*args, **kwargs)
+        handler = [name]
+        token = _current_handler.set(handler)
+        interaction = next((a for a in args if isinstance(a, discord.Interaction)), None)
+        shard = str(shard_of(interaction.guild_id) if interaction is not None else 0)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            metrics.inc("shop_handler_errors_total", handler=handler[0], shard=shard)
+            raise
+        finally:
+            _current_handler.reset(token)
+            metrics.observe("shop_handler_seconds", time.perf_counter() - start, handler=handler[0], shard=shard)
+    return wrapper
+
+
+def instrument_handlers(namespace: dict):
+    """Wrap callback/on_submit/picked and the decorated item methods of every view, item and
+    modal class defined in this module."""
+    decorated = {}
+    for cls in list(namespace.values()):
+        if not (isinstance(cls, type) and cls.__module__ == __name__
+                and issubclass(cls, (discord.ui.Item, discord.ui.View, discord.ui.Modal))):
+            continue
+        for method in ("callback", "on_submit", "picked"):
+            func = vars(cls).get(method)
+            if func is None or not asyncio.iscoroutinefunction(func) or getattr(func, "__isabstractmethod__", False):
+                continue
+            setattr(cls, method, instrumented(func, f"{cls.__name__}.{method}"))
+        # @discord.ui.button/select methods: View.__init_subclass__ already listed them for
+        # each class, and views build their items from that list, so wrap them there too.
+        children = vars(cls).get("__view_children_items__", {})
+        for attr, func in list(children.items()):
+            if isinstance(func, discord.ui.Item) or not asyncio.iscoroutinefunction(func):
+                continue
+            if func not in decorated:
+                decorated[func] = instrumented(func, func.__qualname__)
+            children[attr] = decorated[func]
+            if vars(cls).get(attr) is func:
+                setattr(cls, attr, decorated[func])
+
+
+class RateLimitLog(logging.Handler):
+    """Counts the 429s discord.py retries internally; it only reports them through logging."""
+
+    def emit(self, record: logging.LogRecord):
+        if not str(record.msg).startswith("We are being rate limited"):
+            return
+        method, url = (record.args or ("?", ""))[:2]
+        path = re.sub(r"\d{15,}", "{id}", urlsplit(str(url)).path)
+        metrics.inc("shop_api_ratelimited_total", route=f"{method} {path}")
+
+
+logging.getLogger("discord.http").addHandler(RateLimitLog())
+
+
 class AddItemModal(discord.ui.Modal, title="Add New Item"):
     def __init__(self, server):
         super().__init__()
@@ -61,12 +443,6 @@ class AddItemModal(discord.ui.Modal, title="Add New Item"):
             await interaction.response.send_message("Error: Invalid server selected.", ephemeral=True)
             return
 
-        if os.path.exists(filename):
-            with open(filename, "r") as f:
-                inventory = json.load(f)
-        else:
-            inventory = {}
-
         try:
             price = float(self.price.value.strip())
             stock = int(self.stock.value.strip())
@@ -78,16 +454,8 @@ class AddItemModal(discord.ui.Modal, title="Add New Item"):
         item = self.item_name.value.strip()
         image = self.image_url.value.strip()
 
-        if category not in inventory:
-            inventory[category] = {}
-        inventory[category][item] = {
-            "price": price,
-            "stock": stock,
-            "image": image
-        }
-
-        with open(filename, "w") as f:
-            json.dump(inventory, f, indent=2)
+        await storage.add_item(server, category, item, price, stock, image)
+        image_cache.schedule(image)
 
         await interaction.response.send_message(
             f"✅ **{item}** has been added to **{server.title()}** under **{category}**!", ephemeral=True
@@ -100,10 +468,7 @@ class AddItemModal(discord.ui.Modal, title="Add New Item"):
 class AdditemServerSelect(discord.ui.Select):
     def __init__(self, user_id: int):
         self.user_id = user_id
-        options = [
-            discord.SelectOption(label="2b2t", value="2b2t"),
-            discord.SelectOption(label="Constantiam", value="constantiam")
-        ]
+        options = server_registry.options()
         super().__init__(placeholder="Select the server", options=options, custom_id="server_select")
 
     async def callback(self, interaction: discord.Interaction):
@@ -123,18 +488,134 @@ class AdditemServerSelectView(discord.ui.View):
 class ServerSelectView(discord.ui.View):
     def __init__(self, user_id: int = 0):  # 0 = public
         super().__init__(timeout=None)
-        for srv in SERVER_FILES.keys():
+        for srv in server_registry.names()[:25]:
             self.add_item(ServerButton(user_id, srv))
 
 
+PICKER_WINDOW = 25  # Discord caps a select at 25 options
+
+
+class ItemPicker(discord.ui.View, abc.ABC):
+    """A select over any number of names, shown 25 at a time with paging and a filter.
+
+    The names are kept sorted once; only the visible window is turned into
+    SelectOptions. Subclasses implement picked() for what happens on a choice.
+    """
+
+    placeholder = "Select"
+
+    def __init__(self, user_id: int, names):
+        super().__init__(timeout=None)
+        self.user_id = user_id
+        self.index = sorted((name.lower(), name) for name in names)
+        self.query = ""
+        self.matches = [name for _, name in self.index]
+        self.page = 0
+        self.render()
+
+    @property
+    def page_count(self) -> int:
+        return max(1, (len(self.matches) + PICKER_WINDOW - 1) // PICKER_WINDOW)
+
+    def window(self) -> list:
+        start = self.page * PICKER_WINDOW
+        return self.matches[start:start + PICKER_WINDOW]
+
+    def set_query(self, query: str):
+        self.query = query.strip()
+        q = self.query.lower()
+        if not q:
+            self.matches = [name for _, name in self.index]
+        else:
+            start = bisect.bisect_left(self.index, (q,))
+            prefixed = []
+            for lowered, name in itertools.islice(self.index, start, None):
+                if not lowered.startswith(q):
+                    break
+                prefixed.append(name)
+            taken = set(prefixed)
+            self.matches = prefixed + [name for lowered, name in self.index if q in lowered and name not in taken]
+        self.page = 0
+        self.render()
+
+    def render(self):
+        self.clear_items()
+        window = self.window()
+        if window:
+            start = self.page * PICKER_WINDOW
+            self.add_item(PickerSelect(self.placeholder, [
+                discord.SelectOption(label=name[:100], value=str(start + i)) for i, name in enumerate(window)
+            ]))
+        label = f"Page {self.page + 1}/{self.page_count} · {len(self.matches)}" if self.matches else "No matches"
+        self.add_item(PickerButton("◀", "prev", disabled=self.page == 0))
+        self.add_item(PickerButton(label, "page", disabled=True))
+        self.add_item(PickerButton("▶", "next", disabled=self.page >= self.page_count - 1))
+        self.add_item(PickerButton("🔍 Filter", "filter"))
+        if self.query:
+            self.add_item(PickerButton("✖ Clear", "clear"))
+
+    async def turn(self, interaction: discord.Interaction, step: int):
+        self.page = min(max(self.page + step, 0), self.page_count - 1)
+        self.render()
+        await interaction.response.edit_message(view=self)
+
+    @abc.abstractmethod
+    async def picked(self, interaction: discord.Interaction, name: str):
+        """Act on the name the user chose."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You cannot interact with this menu.", ephemeral=True)
+            return False
+        return True
+
+
+class PickerSelect(discord.ui.Select):
+    def __init__(self, placeholder: str, options: list):
+        super().__init__(placeholder=placeholder, options=options, row=0)
+
+    async def callback(self, interaction: discord.Interaction):
+        index = int(self.values[0])
+        if index >= len(self.view.matches):
+            await interaction.response.send_message("⚠️ That entry is no longer listed.", ephemeral=True)
+            return
+        await self.view.picked(interaction, self.view.matches[index])
+
+
+class PickerButton(discord.ui.Button):
+    def __init__(self, label: str, action: str, disabled: bool = False):
+        super().__init__(label=label, style=discord.ButtonStyle.secondary, disabled=disabled, row=1)
+        self.action = action
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.action == "prev":
+            await self.view.turn(interaction, -1)
+        elif self.action == "next":
+            await self.view.turn(interaction, 1)
+        elif self.action == "filter":
+            await interaction.response.send_modal(PickerFilterModal(self.view))
+        elif self.action == "clear":
+            self.view.set_query("")
+            await interaction.response.edit_message(view=self.view)
+
+
+class PickerFilterModal(discord.ui.Modal, title="Filter"):
+    def __init__(self, picker: ItemPicker):
+        super().__init__()
+        self.picker = picker
+        self.query = discord.ui.TextInput(label="Name contains", default=picker.query, required=False, max_length=100)
+        self.add_item(self.query)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.picker.set_query(self.query.value)
+        await interaction.response.edit_message(view=self.picker)
+
+
 #REMOVE
 class RemoveServerSelect(discord.ui.Select):
     def __init__(self, user_id: int):
         self.user_id = user_id
-        options = [
-            discord.SelectOption(label="2b2t", value="2b2t"),
-            discord.SelectOption(label="Constantiam", value="constantiam")
-        ]
+        options = server_registry.options()
         super().__init__(placeholder="Select server", options=options)
 
     async def callback(self, interaction: discord.Interaction):
@@ -143,7 +624,7 @@ class RemoveServerSelect(discord.ui.Select):
             return
 
         server = self.values[0]
-        inventory = load_inventory(server)
+        inventory = await storage.load(server)
 
         if not inventory:
             await interaction.response.send_message("⚠️ No items found in this server.", ephemeral=True)
@@ -162,20 +643,15 @@ class RemoveServerSelectView(discord.ui.View):
         self.add_item(RemoveServerSelect(user_id))
 
 
-class RemoveCategorySelect(discord.ui.Select):
+class RemoveCategorySelectView(ItemPicker):
+    placeholder = "Select category"
+
     def __init__(self, user_id: int, server: str, categories: list):
-        self.user_id = user_id
         self.server = server
-        options = [discord.SelectOption(label=cat, value=cat) for cat in categories]
-        super().__init__(placeholder="Select category", options=options)
+        super().__init__(user_id, categories)
 
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Unauthorized", ephemeral=True)
-            return
-
-        category = self.values[0]
-        inventory = load_inventory(self.server)
+    async def picked(self, interaction: discord.Interaction, category: str):
+        inventory = await storage.load(self.server)
         items = inventory.get(category, {}).keys()
 
         if not items:
@@ -189,34 +665,16 @@ class RemoveCategorySelect(discord.ui.Select):
         )
 
 
-class RemoveCategorySelectView(discord.ui.View):
-    def __init__(self, user_id: int, server: str, categories: list):
-        super().__init__(timeout=None)
-        self.add_item(RemoveCategorySelect(user_id, server, categories))
+class RemoveItemSelectView(ItemPicker):
+    placeholder = "Select item to delete"
 
-
-class RemoveItemSelect(discord.ui.Select):
     def __init__(self, user_id: int, server: str, category: str, items: list):
-        self.user_id = user_id
         self.server = server
         self.category = category
-        options = [discord.SelectOption(label=item, value=item) for item in items]
-        super().__init__(placeholder="Select item to delete", options=options)
-
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Unauthorized", ephemeral=True)
-            return
-
-        item = self.values[0]
-        inventory = load_inventory(self.server)
-
-        if self.category in inventory and item in inventory[self.category]:
-            del inventory[self.category][item]
-            if not inventory[self.category]:
-                del inventory[self.category]  # clean empty category
-            save_inventory(self.server, inventory)
+        super().__init__(user_id, items)
 
+    async def picked(self, interaction: discord.Interaction, item: str):
+        if await storage.remove_item(self.server, self.category, item):
             await interaction.response.send_message(
                 f"🗑️ Deleted **{item}** from **{self.category}** in **{self.server.title()}**.",
                 ephemeral=True
@@ -227,21 +685,17 @@ class RemoveItemSelect(discord.ui.Select):
                 ephemeral=True
             )
 
-
-class RemoveItemSelectView(discord.ui.View):
-    def __init__(self, user_id: int, server: str, category: str, items: list):
-        super().__init__(timeout=None)
-        self.add_item(RemoveItemSelect(user_id, server, category, items))
-
 #COMMANDS
 @bot.tree.command(name="additem", description="Add a new item to the inventory")
 @app_commands.checks.has_permissions(administrator=True)
+@instrumented
 async def additem(interaction: discord.Interaction):
     view = AdditemServerSelectView(interaction.user.id)
     await interaction.response.send_message("Please select a server:", view=view, ephemeral=True)
 
 @bot.tree.command(name="removeitem", description="Remove an item from the inventory")
 @app_commands.checks.has_permissions(administrator=True)
+@instrumented
 async def removeitem(interaction: discord.Interaction):
     await interaction.response.send_message(
         "🗑️ Select a server to remove an item from:", 
@@ -251,87 +705,2345 @@ async def removeitem(interaction: discord.Interaction):
 
 
 
+_initialized_guilds = set()
+
+
 @bot.event
 async def on_ready():
-    print(f"✅ Logged in as {bot.user} ({bot.user.id})")
+    # Only fires once every shard is ready; guild setup happens per shard below.
+    print(f"✅ Logged in as {bot.user} ({bot.user.id}) on {bot.shard_count} shard(s)")
+    await sync_commands()
+
+
+@bot.event
+async def on_shard_ready(shard_id: int):
+    # Fires again after the shard reconnects; guilds already set up are skipped.
+    guilds = [guild for guild in bot.guilds if guild.shard_id == shard_id]
+    await restore_holds(shard_id)
+    await adopt_legacy_sessions(guilds)
+    pending = [guild for guild in guilds if guild.id not in _initialized_guilds]
+    limit = asyncio.Semaphore(STARTUP_CONCURRENCY)
+
+    async def init(guild):
+        async with limit:
+            await init_guild(guild)
+        ticket_channels.warm(guild)
+
+    started = time.monotonic()
+    await asyncio.gather(*(init(guild) for guild in pending))
+    print(f"✅ Shard {shard_id}: initialized {len(pending)} guilds in {time.monotonic() - started:.1f}s")
+
+
+_restored_shards = set()
+
+
+async def restore_holds(shard_id: int):
+    """Re-place the stock holds of restored carts in this shard's guilds, once per
+    process. Carts of guilds other processes serve keep the holds those placed."""
+    if shard_id in _restored_shards:
+        return
+    _restored_shards.add(shard_id)
+    await reservations.restore_carts(
+        {key: cart for key, cart in user_carts.items() if cart and shard_of(key[0]) == shard_id}
+    )
+
+
+async def adopt_legacy_sessions(guilds: list):
+    """Sessions saved before carts were keyed by guild come back under guild 0;
+    hand each one to the guild its shop channel is in."""
+    for key, channel_id in [(key, c) for key, c in user_tickets.items() if key[0] == 0]:
+        guild = next((g for g in guilds if g.get_channel_or_thread(channel_id)), None)
+        if guild is None:
+            continue
+        new_key = (guild.id, key[1])
+        user_tickets[new_key] = user_tickets.pop(key)
+        cart = user_carts.pop(key, None)
+        await reservations.release(key)
+        if cart is not None:
+            user_carts[new_key] = cart
+            await reservations.restore_carts({new_key: cart})
+        await storage.run(session_store.adopt, key[1], guild.id)
+
+
+async def sync_commands():
+    """Sync the command tree only when it differs from the last synced version."""
+    payload = json.dumps([cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands()], sort_keys=True)
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    if await storage.run(session_store.get_meta, "command_hash") == digest:
+        print("ℹ️ Commands unchanged, skipping sync")
+        return
     synced = await bot.tree.sync()
+    await storage.run(session_store.set_meta, "command_hash", digest)
     print(f"✅ Synced {len(synced)} commands")
 
-    for guild in bot.guilds:
+
+async def init_guild(guild: discord.Guild):
+    channel_name = "shop"
+    try:
+        shop_channel = discord.utils.get(guild.text_channels, name=channel_name)
+
+        if not shop_channel:
+            # Create the channel if it doesn't exist
+            overwrites = {
+                guild.default_role: discord.PermissionOverwrite(view_channel=True, send_messages=True),
+                guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True),
+            }
+
+            shop_channel = await outbound.create_channel(
+                guild, channel_name, priority=PRIORITY_BULK, overwrites=overwrites
+            )
+            print(f"✅ Created #{channel_name} in {guild.name}")
+
+        # The lobby view is persistent, so a UI message that is still there can be reused as is.
+        stored = await storage.run(session_store.get_shop_message, guild.id)
+        if stored and stored[0] == shop_channel.id:
+            try:
+                await outbound.fetch_message(shop_channel, stored[1], PRIORITY_BULK)
+                _initialized_guilds.add(guild.id)
+                print(f"ℹ️ Reusing UI in #{channel_name} for {guild.name}")
+                return
+            except discord.NotFound:
+                pass
+
+        # Clear previous bot messages
+        def is_ours(msg):
+            return msg.author == bot.user
+
+        try:
+            await outbound.submit(
+                lambda: shop_channel.purge(limit=50, check=is_ours),
+                "messages.bulk_delete", shop_channel.id, shop_channel.id, PRIORITY_BULK, shard=guild.shard_id
+            )
+        except discord.Forbidden:
+            # Bulk delete needs Manage Messages; fall back to deleting one by one.
+            await outbound.submit(
+                lambda: shop_channel.purge(limit=50, check=is_ours, bulk=False),
+                "messages.delete", shop_channel.id, shop_channel.id, PRIORITY_BULK, shard=guild.shard_id
+            )
+
+        # Send fresh UI message
+        message = await outbound.send(
+            shop_channel,
+            "👋 Welcome to the shop! Please select a server to start:",
+            view=ServerSelectView(user_id=0),
+            priority=PRIORITY_BULK
+        )
+        await storage.run(session_store.save_shop_message, guild.id, shop_channel.id, message.id)
+        _initialized_guilds.add(guild.id)
+        print(f"✅ Posted UI in #{channel_name} for {guild.name}")
+
+    except discord.Forbidden:
+        print(f"❌ Missing permissions to send message in #{channel_name} for {guild.name}")
+    except discord.HTTPException as e:
+        print(f"❌ Failed to send message in {guild.name}: {e}")
+    except Exception as e:
+        print(f"⚠️ Unexpected error in {guild.name}: {e}")
+
+
+def setup(bot):
+    bot.add_cog(Inventory(bot))
+
+
+def _file_stamp(filename: str):
+    st = os.stat(filename)
+    return st.st_mtime_ns, st.st_size
+
+
+def _write_atomic(filename: str, data: bytes):
+    """Write data to a temp file next to filename, fsync it and rename it into place."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+        metrics.inc("shop_disk_bytes_written_total", len(data))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _parse_journal_line(line: str):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None  # torn write at the end of the journal
+    return record if isinstance(record, dict) else None
+
+
+def _apply_journal_record(inventory: dict, record: dict):
+    op = record.get("op")
+    category = record.get("category")
+    item = record.get("item")
+    items = inventory.get(category)
+
+    if op == "add":
+        inventory.setdefault(category, {})[item] = {
+            "price": record["price"], "stock": record["stock"], "image": record.get("image", "")
+        }
+    elif op == "edit" and items and item in items:
+        new_name = record.get("new_name", item)
+        entry = items.pop(item) if new_name != item else items[item]
+        for field in ("price", "stock", "image"):
+            if field in record:
+                entry[field] = record[field]
+        items[new_name] = entry
+    elif op == "delete" and items and item in items:
+        del items[item]
+        if not items:
+            del inventory[category]
+    elif op == "stock" and items and item in items:
+        items[item]["stock"] = items[item].get("stock", 0) + record["delta"]
+
+
+class JsonInventoryStore:
+    """Inventory kept in the SERVER_FILES snapshots plus an append-only journal.
+
+    Edits are appended to "<file>.journal", one JSON record per line, and
+    replayed on top of the snapshot whenever the inventory is loaded. Once a
+    journal reaches JOURNAL_COMPACT_RECORDS it is folded into a new snapshot
+    that is written to a temp file and renamed over the old one.
+
+    The first journal line holds the SHA-1 of the snapshot it applies to, so a
+    journal left behind by an interrupted compaction is ignored instead of
+    being replayed twice.
+    """
+
+    def __init__(self, files: dict, compact_every: int = 256):
+        self.files = files
+        self.compact_every = compact_every
+        self.locks = {}
+        self.digests = {}  # server -> (snapshot stamp, sha1)
+        self.records = {}  # server -> records in the current journal
+
+    def _lock(self, server: str):
+        return self.locks.setdefault(server, threading.RLock())
+
+    def _paths(self, server: str):
+        filename = self.files[server]
+        return filename, filename + ".journal"
+
+    def _snapshot(self, server: str):
+        filename, _ = self._paths(server)
+        if not os.path.isfile(filename):
+            _write_atomic(filename, b"{}")
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        return raw, hashlib.sha1(raw).hexdigest()
+
+    def _digest(self, server: str) -> str:
+        filename, _ = self._paths(server)
+        stamp = _file_stamp(filename)
+        cached = self.digests.get(server)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        _, digest = self._snapshot(server)
+        self.digests[server] = (stamp, digest)
+        return digest
+
+    def size(self, server: str) -> int:
+        return sum(os.path.getsize(path) for path in self._paths(server) if os.path.isfile(path))
+
+    def stamp(self, server: str):
+        filename, journal = self._paths(server)
+        if not os.path.isfile(filename):
+            with self._lock(server):
+                self._snapshot(server)
+        journal_stamp = _file_stamp(journal) if os.path.isfile(journal) else None
+        return _file_stamp(filename), journal_stamp
+
+    def load(self, server: str) -> dict:
+        _, journal = self._paths(server)
+        with self._lock(server):
+            raw, digest = self._snapshot(server)
+            inventory = json.loads(raw)
+            records = 0
+            if os.path.isfile(journal):
+                with open(journal, 'r', encoding='utf-8') as f:
+                    header = _parse_journal_line(f.readline())
+                    if header and header.get("op") == "base" and header.get("sha1") == digest:
+                        for line in f:
+                            record = _parse_journal_line(line)
+                            if record:
+                                _apply_journal_record(inventory, record)
+                                records += 1
+            self.records[server] = records
+        return inventory
+
+    def _append(self, server: str, record: dict):
+        _, journal = self._paths(server)
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock(server):
+            digest = self._digest(server)
+            header = None
+            if os.path.isfile(journal):
+                with open(journal, 'r', encoding='utf-8') as f:
+                    header = _parse_journal_line(f.readline())
+            if not header or header.get("sha1") != digest:
+                # Missing or stale journal: start a fresh one for this snapshot.
+                line = json.dumps({"op": "base", "sha1": digest}) + "\n" + line
+                mode, self.records[server] = 'w', 0
+            else:
+                mode = 'a'
+            with open(journal, mode, encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            metrics.inc("shop_disk_bytes_written_total", len(line.encode()))
+            self.records[server] = self.records.get(server, 0) + 1
+            if self.records[server] >= self.compact_every:
+                self.compact(server)
+
+    def compact(self, server: str):
+        filename, journal = self._paths(server)
+        with self._lock(server):
+            inventory = self.load(server)
+            if self.records.get(server):
+                _write_atomic(filename, json.dumps(inventory, indent=4).encode())
+            if os.path.isfile(journal):
+                os.remove(journal)
+            self.records[server] = 0
+
+    def replace(self, server: str, inventory: Mapping):
+        filename, journal = self._paths(server)
+        with self._lock(server):
+            _write_atomic(filename, json.dumps(thaw(inventory), indent=4).encode())
+            if os.path.isfile(journal):
+                os.remove(journal)
+            self.records[server] = 0
+
+    def _has_item(self, server: str, category: str, item: str) -> bool:
+        return item in load_inventory(server).get(category, {})
+
+    def upsert_item(self, server: str, category: str, item: str, price: float, stock: int, image: str = ""):
+        self._append(server, {
+            "op": "add", "category": category, "item": item, "price": price, "stock": stock, "image": image or ""
+        })
+
+    def update_item(self, server: str, category: str, item: str, new_name: str,
+                    price: float, stock: int, image: str = "") -> bool:
+        with self._lock(server):
+            if not self._has_item(server, category, item):
+                return False
+            self._append(server, {
+                "op": "edit", "category": category, "item": item, "new_name": new_name,
+                "price": price, "stock": stock, "image": image or ""
+            })
+        return True
+
+    def set_field(self, server: str, category: str, item: str, field: str, value) -> bool:
+        if field not in ("price", "stock"):
+            raise ValueError(f"Cannot update field {field!r}")
+        with self._lock(server):
+            if not self._has_item(server, category, item):
+                return False
+            self._append(server, {"op": "edit", "category": category, "item": item, field: value})
+        return True
+
+    def adjust_stock(self, server: str, category: str, item: str, delta: int) -> bool:
+        with self._lock(server):
+            if not self._has_item(server, category, item):
+                return False
+            self._append(server, {"op": "stock", "category": category, "item": item, "delta": delta})
+        return True
+
+    def delete_item(self, server: str, category: str, item: str) -> bool:
+        with self._lock(server):
+            if not self._has_item(server, category, item):
+                return False
+            self._append(server, {"op": "delete", "category": category, "item": item})
+        return True
+
+
+class SqliteInventoryStore:
+    """Inventory tables in a single SQLite database (WAL mode).
+
+    One connection is shared by the whole process and guarded by a lock;
+    other processes can read the file concurrently thanks to WAL.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS servers (
+            id   INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS categories (
+            id        INTEGER PRIMARY KEY,
+            server_id INTEGER NOT NULL REFERENCES servers(id) ON DELETE CASCADE,
+            name      TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            id          INTEGER PRIMARY KEY,
+            category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+            name        TEXT NOT NULL,
+            price       REAL NOT NULL,
+            stock       INTEGER NOT NULL,
+            image       TEXT NOT NULL DEFAULT ''
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_server_name ON categories(server_id, name);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_items_category_name ON items(category_id, name);
+    """
+
+    ITEM_ID = """
+        SELECT i.id FROM items i
+        JOIN categories c ON c.id = i.category_id
+        JOIN servers s ON s.id = c.server_id
+        WHERE s.name = ? AND c.name = ? AND i.name = ?
+    """
+
+    def __init__(self, path: str, files: dict):
+        self.path = path
+        self.files = files
+        self.ready = set()
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    def ensure(self, server: str):
+        """One-shot import: a server's JSON file is only read the first time the database sees it."""
+        if server in self.ready:
+            return
+        with self.lock:
+            if not self.has_server(server):
+                filename = self.files.get(server)
+                if filename and os.path.isfile(filename):
+                    self.import_json(server, filename)
+                    print(f"✅ Imported {filename} into {self.path}")
+                else:
+                    self.replace(server, {})
+            self.ready.add(server)
+
+    def transaction(self):
+        return _SqliteTransaction(self)
+
+    def size(self, server: str) -> int:
+        # Inventory rows share one file; report the database as a whole.
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def stamp(self, server: str):
+        # data_version is bumped by SQLite whenever another connection commits;
+        # our own writes invalidate the inventory cache explicitly.
+        self.ensure(server)
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def has_server(self, server: str) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM servers WHERE name = ?", (server,)).fetchone()
+        return row is not None
+
+    def _server_id(self, server: str) -> int:
+        self.conn.execute("INSERT OR IGNORE INTO servers (name) VALUES (?)", (server,))
+        return self.conn.execute("SELECT id FROM servers WHERE name = ?", (server,)).fetchone()[0]
+
+    def _category_id(self, server: str, category: str) -> int:
+        server_id = self._server_id(server)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO categories (server_id, name) VALUES (?, ?)", (server_id, category)
+        )
+        return self.conn.execute(
+            "SELECT id FROM categories WHERE server_id = ? AND name = ?", (server_id, category)
+        ).fetchone()[0]
+
+    def _drop_empty_categories(self):
+        self.conn.execute(
+            "DELETE FROM categories WHERE NOT EXISTS (SELECT 1 FROM items WHERE category_id = categories.id)"
+        )
+
+    def load(self, server: str) -> dict:
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT c.name, i.name, i.price, i.stock, i.image
+                FROM categories c
+                JOIN servers s ON s.id = c.server_id
+                LEFT JOIN items i ON i.category_id = c.id
+                WHERE s.name = ?
+                ORDER BY c.id, i.id
+                """,
+                (server,)
+            ).fetchall()
+        inventory = {}
+        for category, name, price, stock, image in rows:
+            items = inventory.setdefault(category, {})
+            if name is not None:
+                items[name] = {"price": price, "stock": stock, "image": image}
+        return inventory
+
+    def upsert_item(self, server: str, category: str, item: str, price: float, stock: int, image: str = ""):
+        with self.transaction():
+            category_id = self._category_id(server, category)
+            self.conn.execute(
+                """
+                INSERT INTO items (category_id, name, price, stock, image) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (category_id, name) DO UPDATE
+                SET price = excluded.price, stock = excluded.stock, image = excluded.image
+                """,
+                (category_id, item, price, stock, image or "")
+            )
+
+    def update_item(self, server: str, category: str, item: str, new_name: str,
+                    price: float, stock: int, image: str = "") -> bool:
+        with self.transaction():
+            row = self.conn.execute(self.ITEM_ID, (server, category, item)).fetchone()
+            if not row:
+                return False
+            if new_name != item:
+                # Renaming onto an existing item replaces it, like the JSON backend does.
+                self.conn.execute(
+                    "DELETE FROM items WHERE id = (SELECT id FROM items WHERE category_id = "
+                    "(SELECT category_id FROM items WHERE id = ?) AND name = ?)",
+                    (row[0], new_name)
+                )
+            self.conn.execute(
+                "UPDATE items SET name = ?, price = ?, stock = ?, image = ? WHERE id = ?",
+                (new_name, price, stock, image or "", row[0])
+            )
+            return True
+
+    def set_field(self, server: str, category: str, item: str, field: str, value) -> bool:
+        if field not in ("price", "stock"):
+            raise ValueError(f"Cannot update field {field!r}")
+        with self.lock:
+            cur = self.conn.execute(
+                f"UPDATE items SET {field} = ? WHERE id = ({self.ITEM_ID})", (value, server, category, item)
+            )
+        return cur.rowcount > 0
+
+    def adjust_stock(self, server: str, category: str, item: str, delta: int) -> bool:
+        with self.lock:
+            cur = self.conn.execute(
+                f"UPDATE items SET stock = stock + ? WHERE id = ({self.ITEM_ID})", (delta, server, category, item)
+            )
+        return cur.rowcount > 0
+
+    def delete_item(self, server: str, category: str, item: str) -> bool:
+        with self.transaction():
+            cur = self.conn.execute(f"DELETE FROM items WHERE id = ({self.ITEM_ID})", (server, category, item))
+            self._drop_empty_categories()
+            return cur.rowcount > 0
+
+    def replace(self, server: str, inventory: Mapping):
+        with self.transaction():
+            server_id = self._server_id(server)
+            self.conn.execute("DELETE FROM categories WHERE server_id = ?", (server_id,))
+            for category, items in inventory.items():
+                category_id = self._category_id(server, category)
+                self.conn.executemany(
+                    "INSERT INTO items (category_id, name, price, stock, image) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (category_id, name, float(info.get("price", 0)), int(info.get("stock", 0)),
+                         info.get("image") or "")
+                        for name, info in items.items()
+                    ]
+                )
+
+    def import_json(self, server: str, filename: str):
+        with open(filename, 'r') as f:
+            self.replace(server, json.load(f))
+
+
+class _SqliteTransaction:
+    def __init__(self, store: SqliteInventoryStore):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        try:
+            self.store.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            # __exit__ won't run, so a busy database must not leave the lock held.
+            self.store.lock.release()
+            raise
+        return self.store.conn
+
+    def __exit__(self, exc_type, exc, tb):
         try:
-            channel_name = "shop"
-            shop_channel = discord.utils.get(guild.text_channels, name=channel_name)
-
-            if not shop_channel:
-                # Create the channel if it doesn't exist
-                overwrites = {
-                    guild.default_role: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-                    guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-                }
-
-                shop_channel = await guild.create_text_channel(name=channel_name, overwrites=overwrites)
-                print(f"✅ Created #{channel_name} in {guild.name}")
+            self.store.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.store.lock.release()
+        return False
+
+
+def open_inventory_store():
+    if INVENTORY_BACKEND != "sqlite":
+        return JsonInventoryStore(SERVER_FILES, JOURNAL_COMPACT_RECORDS)
+    # Servers are imported from their JSON file lazily, on first access.
+    return SqliteInventoryStore(INVENTORY_DB, SERVER_FILES)
+
+
+def _owner_key(owner) -> str:
+    return ":".join(map(str, owner)) if isinstance(owner, tuple) else str(owner)
+
+
+class LocalState:
+    """State backend for a single bot process.
+
+    Backends provide lock() (a context manager around a critical section that
+    must not interleave with other processes), publish(topic, key) to announce
+    a change, and poll() returning the (topic, key) changes other processes
+    published since the last call. Here there are no other processes, so all
+    three are no-ops and stock holds stay in StockReservations' memory.
+    """
+
+    shared = False
+
+    def lock(self):
+        return contextlib.nullcontext()
+
+    def publish(self, topic: str, key):
+        pass
+
+    def poll(self) -> list:
+        return []
+
+
+class SqliteState:
+    """State backend shared by every bot process that uses the same SQLite file.
+
+    lock() is a write transaction: SQLite's writer lock is the cross-process
+    mutex, and a process that dies lets go of it. It is reentrant within a
+    thread. publish() appends to a change feed that each process tails with
+    poll(), skipping its own entries. Stock holds are kept here too (see
+    SharedStockReservations), so every process counts everyone's holds.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS holds (
+            server   TEXT NOT NULL,
+            category TEXT NOT NULL,
+            item     TEXT NOT NULL,
+            owner    TEXT NOT NULL,
+            qty      INTEGER NOT NULL,
+            expires  REAL NOT NULL,
+            PRIMARY KEY (server, category, item, owner)
+        );
+        CREATE INDEX IF NOT EXISTS holds_by_owner ON holds (owner);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            topic  TEXT NOT NULL,
+            key    TEXT NOT NULL,
+            at     REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, keep_changes: float = 3600):
+        self.path = path
+        self.keep_changes = keep_changes
+        self.origin = os.urandom(6).hex()
+        self.mutex = threading.RLock()
+        self.depth = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # Reads go through their own connection so they never wait behind a locked section.
+        self.reader_lock = threading.Lock()
+        self.reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        self.last = self.reader.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self.mutex:
+            if self.depth:
+                self.depth += 1
+                try:
+                    yield self.conn
+                finally:
+                    self.depth -= 1
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.depth = 1
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
             else:
-                print(f"ℹ️ Found existing #{channel_name} in {guild.name}")
+                self.conn.execute("COMMIT")
+            finally:
+                self.depth = 0
+
+    def publish(self, topic: str, key):
+        with self.lock():
+            self.conn.execute(
+                "INSERT INTO changes (origin, topic, key, at) VALUES (?, ?, ?, ?)",
+                (self.origin, topic, _owner_key(key), time.time())
+            )
 
-            # Ensure bot can send messages in the channel
-            test_msg = await shop_channel.send("⏳ Initializing shop...")
-            await test_msg.delete()
+    def poll(self) -> list:
+        with self.reader_lock:
+            rows = self.reader.execute(
+                "SELECT seq, origin, topic, key FROM changes WHERE seq > ? ORDER BY seq", (self.last,)
+            ).fetchall()
+        if rows:
+            self.last = rows[-1][0]
+        return [(topic, key) for _, origin, topic, key in rows if origin != self.origin]
+
+    def reserved(self, key: tuple, exclude=None) -> int:
+        with self.reader_lock:
+            return self.reader.execute(
+                "SELECT COALESCE(SUM(qty), 0) FROM holds WHERE server = ? AND category = ? AND item = ? "
+                "AND expires > ? AND owner != ?",
+                (*key, time.time(), _owner_key(exclude) if exclude is not None else "")
+            ).fetchone()[0]
+
+    def add_hold(self, key: tuple, owner, qty: int, expires: float):
+        """Add qty to owner's live hold (an expired one counts as 0) and push its expiry out."""
+        with self.lock():
+            self.conn.execute(
+                "INSERT INTO holds (server, category, item, owner, qty, expires) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (server, category, item, owner) DO UPDATE SET "
+                "qty = CASE WHEN expires > ? THEN qty ELSE 0 END + excluded.qty, expires = excluded.expires",
+                (*key, _owner_key(owner), qty, expires, time.time())
+            )
 
-            # (Optional) clear previous bot messages
-            async for msg in shop_channel.history(limit=50):
-                if msg.author == bot.user:
-                    await msg.delete()
+    def set_hold(self, key: tuple, owner, qty: int, expires: float):
+        with self.lock():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO holds (server, category, item, owner, qty, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, _owner_key(owner), qty, expires)
+            )
 
-            # Send fresh UI message
-            await shop_channel.send(
-                "👋 Welcome to the shop! Please select a server to start:",
-                view=ServerSelectView(user_id=0)
+    def reduce_hold(self, key: tuple, owner, qty: int):
+        with self.lock():
+            self.conn.execute(
+                "UPDATE holds SET qty = qty - ? WHERE server = ? AND category = ? AND item = ? AND owner = ?",
+                (qty, *key, _owner_key(owner))
             )
-            print(f"✅ Posted UI in #{channel_name} for {guild.name}")
+            self.conn.execute("DELETE FROM holds WHERE qty <= 0")
 
-        except discord.Forbidden:
-            print(f"❌ Missing permissions to send message in #{channel_name} for {guild.name}")
-        except discord.HTTPException as e:
-            print(f"❌ Failed to send message in {guild.name}: {e}")
-        except Exception as e:
-            print(f"⚠️ Unexpected error in {guild.name}: {e}")
+    def release(self, owner, server: str = None):
+        with self.lock():
+            if server is None:
+                self.conn.execute("DELETE FROM holds WHERE owner = ?", (_owner_key(owner),))
+            else:
+                self.conn.execute("DELETE FROM holds WHERE owner = ? AND server = ?", (_owner_key(owner), server))
+
+    def prune(self):
+        with self.lock():
+            self.conn.execute("DELETE FROM holds WHERE expires <= ?", (time.time(),))
+            self.conn.execute("DELETE FROM changes WHERE at < ?", (time.time() - self.keep_changes,))
+
+
+def open_state():
+    if STATE_BACKEND != "sqlite":
+        return LocalState()
+    return SqliteState(SESSION_DB)
+
+
+shared_state = open_state()
+
+
+class SessionStore:
+    """Carts, open shop channels and ticket receipts, kept in SQLite so a restart
+    picks up where it left off. Cart writes touch one line at a time.
+
+    Every change is announced on the state backend, so other processes sharing
+    the database can reload the session from here.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            guild_id   INTEGER NOT NULL,
+            user_id    INTEGER NOT NULL,
+            server     TEXT,
+            channel_id INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS cart_lines (
+            guild_id   INTEGER NOT NULL,
+            user_id    INTEGER NOT NULL,
+            category   TEXT NOT NULL,
+            item       TEXT NOT NULL,
+            quantity   INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            PRIMARY KEY (guild_id, user_id, category, item)
+        );
+        CREATE TABLE IF NOT EXISTS receipts (
+            channel_id INTEGER PRIMARY KEY,
+            embed      TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS shop_messages (
+            guild_id   INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS servers (
+            name     TEXT PRIMARY KEY,
+            label    TEXT NOT NULL,
+            filename TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, state=None):
+        self.path = path
+        self.state = state or LocalState()
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.conn.executescript(self.SCHEMA)
+
+    def _migrate(self):
+        """Sessions used to be keyed by user alone. Old rows move over with guild_id 0
+        and are claimed by the guild their shop channel lives in (see adopt_legacy)."""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")]
+        if not columns or "guild_id" in columns:
+            return
+        with self.transaction():
+            self.conn.execute("ALTER TABLE sessions RENAME TO sessions_v1")
+            self.conn.execute("ALTER TABLE cart_lines RENAME TO cart_lines_v1")
+            for statement in self.SCHEMA.split(";"):  # executescript would commit early
+                if statement.strip():
+                    self.conn.execute(statement)
+            self.conn.execute(
+                "INSERT INTO sessions (guild_id, user_id, server, channel_id) "
+                "SELECT 0, user_id, server, channel_id FROM sessions_v1"
+            )
+            self.conn.execute(
+                "INSERT INTO cart_lines (guild_id, user_id, category, item, quantity, unit_price) "
+                "SELECT 0, user_id, category, item, quantity, unit_price FROM cart_lines_v1 ORDER BY rowid"
+            )
+            self.conn.execute("DROP TABLE sessions_v1")
+            self.conn.execute("DROP TABLE cart_lines_v1")
 
+    def transaction(self):
+        return _SqliteTransaction(self)
 
+    def save_session(self, key: tuple, server: str, channel_id: int):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (guild_id, user_id, server, channel_id) VALUES (?, ?, ?, ?)",
+                (*key, server, channel_id)
+            )
+            self.conn.execute("DELETE FROM cart_lines WHERE guild_id = ? AND user_id = ?", key)
+        self.state.publish("session", key)
+
+    def forget_channel(self, key: tuple):
+        with self.lock:
+            self.conn.execute("UPDATE sessions SET channel_id = NULL WHERE guild_id = ? AND user_id = ?", key)
+        self.state.publish("session", key)
+
+    def save_line(self, key: tuple, server: str, line):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO sessions (guild_id, user_id, server) VALUES (?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET server = excluded.server",
+                (*key, server)
+            )
+            if line.quantity:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cart_lines (guild_id, user_id, category, item, quantity, unit_price) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, line.category, line.name, line.quantity, line.unit_price)
+                )
+            else:
+                self.conn.execute(
+                    "DELETE FROM cart_lines WHERE guild_id = ? AND user_id = ? AND category = ? AND item = ?",
+                    (*key, line.category, line.name)
+                )
+        self.state.publish("session", key)
+
+    def save_cart(self, key: tuple, cart):
+        with self.transaction():
+            self.conn.execute("DELETE FROM cart_lines WHERE guild_id = ? AND user_id = ?", key)
+            self.conn.executemany(
+                "INSERT INTO cart_lines (guild_id, user_id, category, item, quantity, unit_price) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(*key, line.category, line.name, line.quantity, line.unit_price) for line in cart]
+            )
+        self.state.publish("session", key)
+
+    def drop_session(self, key: tuple):
+        with self.transaction():
+            self.conn.execute("DELETE FROM sessions WHERE guild_id = ? AND user_id = ?", key)
+            self.conn.execute("DELETE FROM cart_lines WHERE guild_id = ? AND user_id = ?", key)
+        self.state.publish("session", key)
+
+    def adopt(self, user_id: int, guild_id: int):
+        """Move a pre-sharding session (guild_id 0) to the guild it belongs to."""
+        with self.transaction():
+            for table in ("sessions", "cart_lines"):
+                self.conn.execute(
+                    f"UPDATE OR REPLACE {table} SET guild_id = ? WHERE guild_id = 0 AND user_id = ?",
+                    (guild_id, user_id)
+                )
+        self.state.publish("session", (0, user_id))
+        self.state.publish("session", (guild_id, user_id))
+
+    def save_receipt(self, channel_id: int, embed: discord.Embed):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO receipts (channel_id, embed) VALUES (?, ?)",
+                (channel_id, json.dumps(embed.to_dict()))
+            )
+        self.state.publish("receipt", channel_id)
+
+    def drop_receipt(self, channel_id: int):
+        with self.lock:
+            self.conn.execute("DELETE FROM receipts WHERE channel_id = ?", (channel_id,))
+        self.state.publish("receipt", channel_id)
+
+    def get_shop_message(self, guild_id: int):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT channel_id, message_id FROM shop_messages WHERE guild_id = ?", (guild_id,)
+            ).fetchone()
+
+    def save_shop_message(self, guild_id: int, channel_id: int, message_id: int):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shop_messages (guild_id, channel_id, message_id) VALUES (?, ?, ?)",
+                (guild_id, channel_id, message_id)
+            )
 
+    def get_meta(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
 
+    def set_meta(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
 
+    def load_servers(self) -> list:
+        with self.lock:
+            return self.conn.execute("SELECT name, label, filename FROM servers ORDER BY rowid").fetchall()
 
-def setup(bot):
-    bot.add_cog(Inventory(bot))
+    def save_server(self, name: str, label: str, filename: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO servers (name, label, filename) VALUES (?, ?, ?)", (name, label, filename)
+            )
+        self.state.publish("servers", name)
+
+    def drop_server(self, name: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM servers WHERE name = ?", (name,))
+        self.state.publish("servers", name)
+
+    def load(self):
+        """Return (carts, tickets, receipts) shaped like user_carts, user_tickets and ticket_receipts."""
+        with self.lock:
+            sessions = self.conn.execute("SELECT guild_id, user_id, server, channel_id FROM sessions").fetchall()
+            lines = self.conn.execute(
+                "SELECT guild_id, user_id, category, item, quantity, unit_price FROM cart_lines ORDER BY rowid"
+            ).fetchall()
+            receipts = self.conn.execute("SELECT channel_id, embed FROM receipts").fetchall()
+
+        carts = {(guild_id, user_id): Cart(server) for guild_id, user_id, server, _ in sessions}
+        tickets = {(guild_id, user_id): channel_id for guild_id, user_id, _, channel_id in sessions if channel_id}
+        for guild_id, user_id, category, item, quantity, unit_price in lines:
+            cart = carts.get((guild_id, user_id))
+            if cart is not None:
+                cart.add(category, item, unit_price, quantity)
+        receipts = {channel_id: discord.Embed.from_dict(json.loads(embed)) for channel_id, embed in receipts}
+        return carts, tickets, receipts
+
+    def load_session(self, key: tuple):
+        """Return (cart, channel_id) for one session, or (None, None) if there is none."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT server, channel_id FROM sessions WHERE guild_id = ? AND user_id = ?", key
+            ).fetchone()
+            lines = self.conn.execute(
+                "SELECT category, item, quantity, unit_price FROM cart_lines "
+                "WHERE guild_id = ? AND user_id = ? ORDER BY rowid", key
+            ).fetchall()
+        if row is None:
+            return None, None
+        cart = Cart(row[0])
+        for category, item, quantity, unit_price in lines:
+            cart.add(category, item, unit_price, quantity)
+        return cart, row[1]
+
+    def load_receipt(self, channel_id: int):
+        with self.lock:
+            row = self.conn.execute("SELECT embed FROM receipts WHERE channel_id = ?", (channel_id,)).fetchone()
+        return discord.Embed.from_dict(json.loads(row[0])) if row else None
+
+
+session_store = SessionStore(SESSION_DB, shared_state)
+
+
+class ServerRegistry:
+    """The game servers the shop sells for, kept in the session database.
+
+    SERVER_FILES is the live name -> inventory file mapping that the stores
+    and views read; add() and remove() update it in place. Nothing is loaded
+    for a server until something asks for its inventory. Once the bot runs,
+    the database is only touched from the storage pool; the mappings are only
+    changed on the event loop.
+    """
+
+    NAME = re.compile(r"[a-z0-9_-]{1,24}")
+
+    def __init__(self, store: SessionStore, files: dict):
+        self.store = store
+        self.files = files
+        self.labels = {}
+
+    def load(self):
+        self._apply(self._rows())
+
+    async def reload(self):
+        self._apply(await storage.run(self._rows))
+
+    def _rows(self) -> list:
+        rows = self.store.load_servers()
+        if not rows:
+            for name, (label, filename) in DEFAULT_SERVERS.items():
+                self.store.save_server(name, label, filename)
+            rows = self.store.load_servers()
+        return rows
+
+    def _apply(self, rows: list):
+        files = {name: filename for name, _, filename in rows}
+        for name in [name for name in self.files if name not in files]:
+            del self.files[name]
+        self.files.update(files)
+        self.labels = {name: label for name, label, _ in rows}
+
+    def names(self) -> list:
+        return list(self.files)
+
+    def label(self, server: str) -> str:
+        return self.labels.get(server, server.title())
+
+    def options(self) -> list:
+        return [discord.SelectOption(label=self.label(name), value=name) for name in self.files][:25]
+
+    async def add(self, name: str, label: str = None, filename: str = None):
+        """Register or update a server. Returns an error message, or None."""
+        name = name.strip().lower()
+        if not self.NAME.fullmatch(name):
+            return "Server names are 1-24 characters of a-z, 0-9, - or _."
+        filename = filename or self.files.get(name) or f"{name}_inventory.json"
+        if os.path.basename(filename) != filename or not filename.endswith(".json"):
+            return "The inventory file must be a plain .json file name."
+        owner = next((other for other, f in self.files.items() if other != name and f.lower() == filename.lower()), None)
+        if owner:
+            return f"`{filename}` already holds the inventory of `{owner}`."
+        label = (label or self.labels.get(name) or name.title())[:80]
+        await storage.run(self.store.save_server, name, label, filename)
+        self.files[name] = filename
+        self.labels[name] = label
+        return None
+
+    async def remove(self, name: str) -> bool:
+        if name not in self.files:
+            return False
+        await storage.run(self.store.drop_server, name)
+        del self.files[name]
+        self.labels.pop(name, None)
+        evict_inventory(name)
+        return True
+
+
+server_registry = ServerRegistry(session_store, SERVER_FILES)
+server_registry.load()
+inventory_store = open_inventory_store()
+
+
+class OrderLedger:
+    """Every checkout, kept in SQLite for /orders, /sales and /topitems.
+
+    record() writes the order, its lines and the daily per-server and
+    per-item rollups in one transaction, so the reports read a handful of
+    rollup rows instead of scanning orders. Days are UTC.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id   INTEGER NOT NULL,
+            user_id    INTEGER NOT NULL,
+            server     TEXT NOT NULL,
+            units      INTEGER NOT NULL,
+            total      REAL NOT NULL,
+            ticket_id  INTEGER,
+            created_at REAL NOT NULL,
+            closed_at  REAL
+        );
+        CREATE INDEX IF NOT EXISTS orders_by_guild ON orders (guild_id, created_at);
+        CREATE INDEX IF NOT EXISTS orders_by_user ON orders (guild_id, user_id, created_at);
+        CREATE INDEX IF NOT EXISTS orders_by_ticket ON orders (ticket_id);
+        CREATE TABLE IF NOT EXISTS order_lines (
+            order_id   INTEGER NOT NULL REFERENCES orders (id),
+            category   TEXT NOT NULL,
+            item       TEXT NOT NULL,
+            quantity   INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            PRIMARY KEY (order_id, category, item)
+        );
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            guild_id INTEGER NOT NULL,
+            day      TEXT NOT NULL,
+            server   TEXT NOT NULL,
+            orders   INTEGER NOT NULL,
+            units    INTEGER NOT NULL,
+            revenue  REAL NOT NULL,
+            PRIMARY KEY (guild_id, day, server)
+        );
+        CREATE TABLE IF NOT EXISTS daily_items (
+            guild_id INTEGER NOT NULL,
+            day      TEXT NOT NULL,
+            server   TEXT NOT NULL,
+            category TEXT NOT NULL,
+            item     TEXT NOT NULL,
+            orders   INTEGER NOT NULL,
+            units    INTEGER NOT NULL,
+            revenue  REAL NOT NULL,
+            PRIMARY KEY (guild_id, day, server, category, item)
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def transaction(self):
+        return _SqliteTransaction(self)
+
+    @staticmethod
+    def day(ts: float) -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+    def record(self, key: tuple, server: str, lines: list, ticket_id: int, created_at: float = None) -> int:
+        """Store a checkout of [(category, item, quantity, unit_price)] and return its order id."""
+        created_at = time.time() if created_at is None else created_at
+        day = self.day(created_at)
+        units = sum(qty for _, _, qty, _ in lines)
+        total = round(sum(qty * price for _, _, qty, price in lines), 2)
+        with self.transaction():
+            order_id = self.conn.execute(
+                "INSERT INTO orders (guild_id, user_id, server, units, total, ticket_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, server, units, total, ticket_id, created_at)
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO order_lines (order_id, category, item, quantity, unit_price) VALUES (?, ?, ?, ?, ?)",
+                [(order_id, *line) for line in lines]
+            )
+            self.conn.execute(
+                "INSERT INTO daily_sales (guild_id, day, server, orders, units, revenue) VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (guild_id, day, server) DO UPDATE SET orders = orders + 1, "
+                "units = units + excluded.units, revenue = revenue + excluded.revenue",
+                (key[0], day, server, units, total)
+            )
+            self.conn.executemany(
+                "INSERT INTO daily_items (guild_id, day, server, category, item, orders, units, revenue) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (guild_id, day, server, category, item) DO UPDATE SET orders = orders + 1, "
+                "units = units + excluded.units, revenue = revenue + excluded.revenue",
+                [(key[0], day, server, category, item, qty, qty * price) for category, item, qty, price in lines]
+            )
+        return order_id
+
+    def close(self, ticket_id: int):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE orders SET closed_at = ? WHERE ticket_id = ? AND closed_at IS NULL", (time.time(), ticket_id)
+            )
+
+    def orders(self, guild_id: int, user_id: int = None, limit: int = 10) -> list:
+        """Newest first: (id, user_id, server, units, total, ticket_id, created_at, closed_at)."""
+        columns = "id, user_id, server, units, total, ticket_id, created_at, closed_at"
+        with self.lock:
+            if user_id is None:
+                return self.conn.execute(
+                    f"SELECT {columns} FROM orders WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?",
+                    (guild_id, limit)
+                ).fetchall()
+            return self.conn.execute(
+                f"SELECT {columns} FROM orders WHERE guild_id = ? AND user_id = ? ORDER BY created_at DESC LIMIT ?",
+                (guild_id, user_id, limit)
+            ).fetchall()
+
+    def lines(self, order_ids: list) -> dict:
+        """order id -> [(category, item, quantity, unit_price)]"""
+        result = {order_id: [] for order_id in order_ids}
+        if not order_ids:
+            return result
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT order_id, category, item, quantity, unit_price FROM order_lines "
+                f"WHERE order_id IN ({','.join('?' * len(order_ids))})", order_ids
+            ).fetchall()
+        for order_id, *line in rows:
+            result[order_id].append(tuple(line))
+        return result
+
+    def sales(self, guild_id: int, since: float, server: str = None) -> list:
+        """(day, orders, units, revenue) per day from the rollup, newest first."""
+        query = "SELECT day, SUM(orders), SUM(units), SUM(revenue) FROM daily_sales WHERE guild_id = ? AND day >= ?"
+        args = [guild_id, self.day(since)]
+        if server:
+            query += " AND server = ?"
+            args.append(server)
+        with self.lock:
+            return self.conn.execute(query + " GROUP BY day ORDER BY day DESC", args).fetchall()
+
+    def top_items(self, guild_id: int, since: float, server: str = None, limit: int = 10) -> list:
+        """(server, category, item, orders, units, revenue) by units sold, from the rollup."""
+        query = (
+            "SELECT server, category, item, SUM(orders), SUM(units), SUM(revenue) FROM daily_items "
+            "WHERE guild_id = ? AND day >= ?"
+        )
+        args = [guild_id, self.day(since)]
+        if server:
+            query += " AND server = ?"
+            args.append(server)
+        query += " GROUP BY server, category, item ORDER BY SUM(units) DESC, SUM(revenue) DESC LIMIT ?"
+        with self.lock:
+            return self.conn.execute(query, args + [limit]).fetchall()
+
+
+order_ledger = OrderLedger(LEDGER_DB)
+
+
+# Inventory cache: one parsed copy per server, shared by every
+# interaction. Copies are stamped by the store (file mtime/size for JSON,
+# data_version for SQLite) so edits made outside the bot are picked up without
+# restarting it, loaded on first use and dropped again once idle.
+_inventory_cache = {}
+_inventory_cache_lock = threading.Lock()
+
+
+class _CachedInventory:
+    __slots__ = ("stamp", "view", "used")
+
+    def __init__(self, stamp, view):
+        self.stamp = stamp
+        self.view = view
+        self.used = time.monotonic()
 
 
-def load_inventory(server: str) -> dict:
-    filename = SERVER_FILES.get(server.lower())
-    if not filename:
-        return {}
-    if not os.path.isfile(filename):
-        with open(filename, 'w') as f:
-            json.dump({}, f, indent=4)
-    with open(filename, 'r') as f:
-        return json.load(f)
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _freeze_shared(value, previous):
+    """Freeze value, reusing the parts of previous (an older frozen view) that did not change.
+
+    Unchanged categories and items keep their identity across reloads, which is
+    what render_cache checks its entries against.
+    """
+    if isinstance(value, dict) and isinstance(previous, Mapping):
+        if previous == value:
+            return previous
+        return MappingProxyType({k: _freeze_shared(v, previous.get(k)) for k, v in value.items()})
+    return _freeze(value)
+
+
+def thaw(value):
+    """Return a plain, mutable deep copy of a view handed out by load_inventory."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def invalidate_inventory(server: str = None):
+    # The cached copy stays around (unstamped) so the reload can share its unchanged parts.
+    with _inventory_cache_lock:
+        entries = _inventory_cache.values() if server is None else [_inventory_cache.get(server.lower())]
+        for cached in entries:
+            if cached is not None:
+                cached.stamp = None
+
+
+def load_inventory(server: str) -> Mapping:
+    """Return a read-only view of a server's inventory.
+
+    Use thaw() on it when the result is going to be modified.
+    """
+    server = server.lower()
+    if server not in SERVER_FILES:
+        return MappingProxyType({})
+
+    stamp = inventory_store.stamp(server)
+    with _inventory_cache_lock:
+        cached = _inventory_cache.get(server)
+        if cached and cached.stamp == stamp:
+            cached.used = time.monotonic()
+            metrics.inc("shop_inventory_cache_total", result="hit")
+            return cached.view
+
+    metrics.inc("shop_inventory_cache_total", result="miss")
+    start = time.perf_counter()
+    view = _freeze_shared(inventory_store.load(server), cached.view if cached else None)
+    metrics.observe("shop_inventory_load_seconds", time.perf_counter() - start, server=server)
+    metrics.inc("shop_inventory_load_bytes_total", inventory_store.size(server), server=server)
+
+    with _inventory_cache_lock:
+        _inventory_cache[server] = _CachedInventory(stamp, view)
+    search_index.sync(server, stamp, view)
+    return view
+
+
+def evict_inventory(server: str):
+    with _inventory_cache_lock:
+        _inventory_cache.pop(server, None)
+    search_index.drop(server)
+    render_cache.drop(server)
+
+
+def evict_idle_inventories(max_idle: float) -> list:
+    cutoff = time.monotonic() - max_idle
+    with _inventory_cache_lock:
+        idle = [server for server, cached in _inventory_cache.items() if cached.used < cutoff]
+    for server in idle:
+        evict_inventory(server)
+    return idle
+
+
+async def inventory_reaper():
+    while True:
+        await asyncio.sleep(min(INVENTORY_IDLE_TTL, 60))
+        for server in evict_idle_inventories(INVENTORY_IDLE_TTL):
+            print(f"💤 Unloaded idle inventory for {server}")
+
+
+class InventoryEvent:
+    __slots__ = ("kind", "server", "category", "item")
+
+    def __init__(self, kind: str, server: str, category: str = None, item: str = None):
+        self.kind = kind
+        self.server = server
+        self.category = category
+        self.item = item
+
+    def __repr__(self):
+        return f"InventoryEvent({self.kind!r}, {self.server!r}, {self.category!r}, {self.item!r})"
+
+
+class InventoryEvents:
+    """In-process bus for inventory changes: "added", "changed", "removed" and "stock" events.
+
+    _edit_inventory() emits them for every write, from whichever thread it runs
+    on; subscribers are called on the event loop once the write is visible to
+    load_inventory(). An event without a category covers the whole server (a
+    catalog import, or a change made by another process).
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = []
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def emit(self, kind: str, server: str, category: str = None, item: str = None):
+        if self.loop is None or self.loop.is_closed():
+            return  # nothing is listening before the bot starts
+        metrics.inc("shop_inventory_events_total", kind=kind)
+        self.loop.call_soon_threadsafe(self._dispatch, InventoryEvent(kind, server, category, item))
+
+    def _dispatch(self, event: InventoryEvent):
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ Inventory event handler failed for {event}: {e}")
+
+
+inventory_events = InventoryEvents()
+
+
+def _write_events(op: str, args: tuple, existed: bool = False) -> list:
+    """(kind, category, item) for each event an inventory write stands for; existed
+    tells whether an upserted item was already there."""
+    if op == "upsert_item":
+        return [("changed" if existed else "added", args[0], args[1])]
+    if op == "update_item":
+        category, item, new_name = args[:3]
+        if new_name != item:
+            return [("removed", category, item), ("added", category, new_name)]
+        return [("changed", category, item)]
+    if op == "delete_item":
+        return [("removed", args[0], args[1])]
+    if op == "set_field":
+        return [("stock" if args[2] == "stock" else "changed", args[0], args[1])]
+    if op == "adjust_stock":
+        return [("stock", args[0], args[1])]
+    return [("changed", None, None)]
+
+
+def _item_exists(server: str, category: str, item: str, stamp) -> bool:
+    # The search index follows every write, so it can usually answer without reloading the inventory.
+    known = search_index.contains(server, category, item, stamp)
+    return known if known is not None else item in load_inventory(server).get(category, {})
+
+
+def _edit_inventory(server: str, op: str, *args):
+    server = server.lower()
+    if server not in SERVER_FILES:
+        return False
+    start = time.perf_counter()
+    try:
+        with shared_state.lock():
+            before = inventory_store.stamp(server)
+            existed = op == "upsert_item" and _item_exists(server, args[0], args[1], before)
+            result = getattr(inventory_store, op)(server, *args)
+            shared_state.publish("inventory", server)
+    finally:
+        invalidate_inventory(server)
+        metrics.observe("shop_inventory_write_seconds", time.perf_counter() - start, op=op)
+    search_index.apply(server, op, args, result, before, inventory_store.stamp(server))
+    if result is not False:
+        for kind, category, item in _write_events(op, args, existed):
+            inventory_events.emit(kind, server, category, item)
+    return result
+
 
 def save_inventory(server: str, data: dict):
-    filename = SERVER_FILES.get(server.lower())
-    if not filename:
-        return
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=4)
+    _edit_inventory(server, "replace", data)
+
+
+# Item-level edits. SQLite touches a single row, the JSON store appends one
+# journal record; neither rewrites the whole catalog.
+def inventory_add_item(server: str, category: str, item: str, price: float, stock: int, image: str = ""):
+    _edit_inventory(server, "upsert_item", category, item, price, stock, image)
+
+
+def inventory_update_item(server: str, category: str, item: str, new_name: str,
+                          price: float, stock: int, image: str = "") -> bool:
+    return _edit_inventory(server, "update_item", category, item, new_name, price, stock, image)
+
+
+def inventory_remove_item(server: str, category: str, item: str) -> bool:
+    return _edit_inventory(server, "delete_item", category, item)
+
+
+def inventory_set_price(server: str, category: str, item: str, price: float) -> bool:
+    return _edit_inventory(server, "set_field", category, item, "price", price)
+
+
+def inventory_set_stock(server: str, category: str, item: str, stock: int) -> bool:
+    return _edit_inventory(server, "set_field", category, item, "stock", stock)
+
+
+def inventory_adjust_stock(server: str, category: str, item: str, delta: int) -> bool:
+    return _edit_inventory(server, "adjust_stock", category, item, delta)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ItemSearchIndex:
+    """Prefix and trigram index over item names, for /search and autocomplete.
+
+    Each server is indexed per category plus once as a whole (scope None),
+    with names sorted and trigram posting lists kept in the same order; the
+    scopes share their entries. A prefix query bisects into the scope's names,
+    a substring query walks the shortest posting list among the query's
+    trigrams. Servers are merged in name order and the walk stops at the
+    limit, so hits come back sorted and a category filter narrows the work
+    instead of being applied afterwards.
+
+    Edits that go through _edit_inventory are applied one item at a time. A
+    server whose store stamp moved underneath the index (an edit made outside
+    the bot) is rebuilt the next time load_inventory reads it. Queries never
+    touch the store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamps = {}
+        self._names = {}     # server -> {category or None: sorted [(lowered name, item, category)]}
+        self._trigrams = {}  # server -> {category or None: {trigram: sorted [(lowered name, item, category)]}}
+
+    def sync(self, server: str, stamp, inventory: Mapping):
+        with self._lock:
+            if server in self._stamps and self._stamps[server] == stamp:
+                return
+            self._build(server, inventory)
+            self._stamps[server] = stamp
+
+    def loaded(self, server: str) -> bool:
+        return server in self._stamps
+
+    def contains(self, server: str, category: str, item: str, stamp):
+        """Whether item is listed as of the store's stamp, or None if the index can't tell."""
+        with self._lock:
+            if server not in self._stamps or self._stamps[server] != stamp:
+                return None
+            names = self._names[server].get(category, [])
+            entry = (item.lower(), item, category)
+            i = bisect.bisect_left(names, entry)
+            return i < len(names) and names[i] == entry
+
+    def drop(self, server: str):
+        with self._lock:
+            for table in (self._stamps, self._names, self._trigrams):
+                table.pop(server, None)
+
+    def apply(self, server: str, op: str, args: tuple, result, before, after):
+        with self._lock:
+            if server not in self._stamps or self._stamps[server] != before:
+                # Not built yet, or already stale: let the next load rebuild it.
+                self._stamps.pop(server, None)
+                return
+            if op == "upsert_item":
+                self._add(server, args[0], args[1])
+            elif op == "update_item" and result:
+                self._remove(server, args[0], args[1])
+                self._add(server, args[0], args[2])
+            elif op == "delete_item" and result:
+                self._remove(server, args[0], args[1])
+            elif op == "replace":
+                self._build(server, args[0])
+            self._stamps[server] = after
+
+    def _build(self, server: str, inventory: Mapping):
+        entries = sorted((item.lower(), item, category) for category, items in inventory.items() for item in items)
+        names, trigrams = {None: entries}, {None: {}}
+        for entry in entries:
+            names.setdefault(entry[2], []).append(entry)  # appended in name order, so sorted
+            grams = _trigrams(entry[0])
+            for scope in (None, entry[2]):
+                postings = trigrams.setdefault(scope, {})
+                for tri in grams:
+                    postings.setdefault(tri, []).append(entry)
+        self._names[server] = names
+        self._trigrams[server] = trigrams
+
+    def _add(self, server: str, category: str, item: str):
+        entry = (item.lower(), item, category)
+        grams = _trigrams(entry[0])
+        for scope in (None, category):
+            names = self._names[server].setdefault(scope, [])
+            i = bisect.bisect_left(names, entry)
+            if i < len(names) and names[i] == entry:
+                return
+            names.insert(i, entry)
+            postings = self._trigrams[server].setdefault(scope, {})
+            for tri in grams:
+                bisect.insort(postings.setdefault(tri, []), entry)
+
+    def _remove(self, server: str, category: str, item: str):
+        entry = (item.lower(), item, category)
+        grams = _trigrams(entry[0])
+        for scope in (None, category):
+            names = self._names[server].get(scope, [])
+            i = bisect.bisect_left(names, entry)
+            if i == len(names) or names[i] != entry:
+                return
+            del names[i]
+            postings = self._trigrams[server][scope]
+            for tri in grams:
+                posting = postings.get(tri)
+                if posting:
+                    j = bisect.bisect_left(posting, entry)
+                    if j < len(posting) and posting[j] == entry:
+                        del posting[j]
+                    if not posting:
+                        del postings[tri]
+            if not names and scope is not None:
+                del self._names[server][scope]
+                del self._trigrams[server][scope]
+
+    @staticmethod
+    def _prefixed(names: list, query: str, server: str):
+        for i in range(bisect.bisect_left(names, (query,)), len(names)):
+            lowered, item, category = names[i]
+            if not lowered.startswith(query):
+                return
+            yield lowered, server, category, item
+
+    @staticmethod
+    def _containing(postings: dict, query: str, server: str):
+        lists = [postings.get(tri) for tri in _trigrams(query)]
+        if not all(lists):
+            return
+        for lowered, item, category in min(lists, key=len):
+            if query in lowered and not lowered.startswith(query):  # prefix matches are already listed
+                yield lowered, server, category, item
+
+    def items(self, query: str, server: str = None, category: str = None, limit: int = 25) -> list:
+        """Return up to limit (server, category, item) matches: name prefixes first, then substrings,
+        each in name order."""
+        query = query.strip().lower()
+        with self._lock:
+            servers = [
+                srv for srv in ([server] if server else sorted(self._names)) if category in self._names.get(srv, ())
+            ]
+            hits = heapq.merge(*(self._prefixed(self._names[srv][category], query, srv) for srv in servers))
+            results = [(srv, cat, item) for _, srv, cat, item in itertools.islice(hits, limit)]
+            if len(query) >= 3 and len(results) < limit:
+                hits = heapq.merge(*(self._containing(self._trigrams[srv][category], query, srv) for srv in servers))
+                results += [(srv, cat, item) for _, srv, cat, item in itertools.islice(hits, limit - len(results))]
+            return results
+
+    def categories(self, server: str, query: str = "", limit: int = 25) -> list:
+        query = query.strip().lower()
+        with self._lock:
+            names = sorted(category for category in self._names.get(server, ()) if category is not None)
+        prefixed = [name for name in names if name.lower().startswith(query)]
+        contained = [name for name in names if query in name.lower() and name not in prefixed]
+        return (prefixed + contained)[:limit]
+
+
+search_index = ItemSearchIndex()
+
+
+class AsyncStorage:
+    """Awaitable wrappers that run inventory and file I/O on a small thread pool.
+
+    Coroutines must use these instead of calling load_inventory/save_inventory
+    directly, so a slow disk never blocks the gateway loop.
+    """
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shop-storage")
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def load(self, server: str) -> Mapping:
+        return await self.run(load_inventory, server)
+
+    async def save(self, server: str, data: dict):
+        await self.run(save_inventory, server, data)
+
+    async def add_item(self, server: str, category: str, item: str, price: float, stock: int, image: str = ""):
+        await self.run(inventory_add_item, server, category, item, price, stock, image)
+
+    async def update_item(self, server: str, category: str, item: str, new_name: str,
+                          price: float, stock: int, image: str = "") -> bool:
+        return await self.run(inventory_update_item, server, category, item, new_name, price, stock, image)
+
+    async def remove_item(self, server: str, category: str, item: str) -> bool:
+        return await self.run(inventory_remove_item, server, category, item)
+
+    async def set_price(self, server: str, category: str, item: str, price: float) -> bool:
+        return await self.run(inventory_set_price, server, category, item, price)
+
+    async def set_stock(self, server: str, category: str, item: str, stock: int) -> bool:
+        return await self.run(inventory_set_stock, server, category, item, stock)
+
+    async def adjust_stock(self, server: str, category: str, item: str, delta: int) -> bool:
+        return await self.run(inventory_adjust_stock, server, category, item, delta)
+
+
+storage = AsyncStorage(STORAGE_WORKERS)
+
+
+PRIORITY_INTERACTION = 0  # replies the clicking user is waiting on
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2  # catalog dumps, log posts, startup housekeeping
+
+# (requests, seconds) per bucket. "channel" is shared by every message call in
+# one channel; route buckets are keyed by (route, guild or channel id).
+OUTBOUND_LIMITS = {
+    "global": (45, 1.0),
+    "channel": (5, 5.0),
+    "channels.create": (5, 10.0),
+    "channels.delete": (5, 10.0),
+    "channels.edit": (2, 600.0),
+    "threads.create": (5, 10.0),
+}
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def delay(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _OutboundJob:
+    __slots__ = ("factory", "route", "buckets", "future", "coalesce_key", "shard")
+
+    def __init__(self, factory, route, buckets, future, coalesce_key, shard):
+        self.factory = factory
+        self.route = route
+        self.buckets = buckets
+        self.future = future
+        self.coalesce_key = coalesce_key
+        self.shard = shard
+
+
+class _OutboundLane:
+    """One shard's queue, workers and backpressure."""
+    __slots__ = ("queue", "slots", "tasks")
+
+    def __init__(self, max_pending: int):
+        self.queue = asyncio.PriorityQueue()
+        self.slots = asyncio.Semaphore(max_pending)
+        self.tasks = []
+
+
+class OutboundDispatcher:
+    """Queue that every channel send/edit/delete/create goes through.
+
+    Jobs are taken in priority order and only run once the global, route and
+    channel buckets they touch have a token; a job that has to wait is parked
+    and re-queued instead of blocking the jobs behind it. A pending edit of a
+    message is replaced by a newer edit of the same message. Callers block in
+    submit() once max_pending jobs are outstanding.
+
+    Each shard gets its own lane (queue, workers and max_pending), so a guild
+    backlog on one shard never holds up the others. Buckets are shared: the
+    global limit applies to the bot token, not to a shard.
+
+    Interaction callbacks (interaction.response.*) stay direct: they use their
+    own endpoint and must answer within three seconds.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 500, limits: dict = OUTBOUND_LIMITS):
+        self.workers = workers
+        self.limits = limits
+        self.max_pending = max_pending
+        self.buckets = {}
+        self.coalescing = {}
+        self.seq = itertools.count()
+        self.lanes = {}  # shard id -> _OutboundLane
+
+    def _start(self, shard: int) -> _OutboundLane:
+        lane = self.lanes.get(shard)
+        if lane is None:
+            lane = self.lanes[shard] = _OutboundLane(self.max_pending)
+        lane.tasks = [t for t in lane.tasks if not t.done()]
+        while len(lane.tasks) < self.workers:
+            lane.tasks.append(asyncio.create_task(self._worker(lane)))
+        return lane
+
+    def depth(self, shard: int = None) -> int:
+        lanes = self.lanes.values() if shard is None else [self.lanes[shard]] if shard in self.lanes else []
+        return sum(lane.queue.qsize() for lane in lanes)
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) > 5000:
+                # Forget idle buckets; a full bucket carries no state worth keeping.
+                for k, b in list(self.buckets.items()):
+                    b.delay()
+                    if b.tokens >= b.capacity:
+                        del self.buckets[k]
+            bucket = self.buckets[key] = TokenBucket(*self.limits[key[0]])
+        return bucket
+
+    async def submit(self, factory, route: str, major: int = None, channel_id: int = None,
+                     priority: int = PRIORITY_NORMAL, coalesce_key=None, shard: int = 0):
+        """Run factory() (a coroutine factory) when its buckets allow and return its result."""
+        lane = self._start(shard)
+        if coalesce_key is not None and coalesce_key in self.coalescing:
+            job = self.coalescing[coalesce_key]
+            job.factory = factory
+            return await asyncio.shield(job.future)
+
+        buckets = [("global",)]
+        if route in self.limits:
+            buckets.append((route, major))
+        if channel_id is not None:
+            buckets.append(("channel", channel_id))
+
+        await lane.slots.acquire()
+        job = _OutboundJob(factory, route, buckets, asyncio.get_running_loop().create_future(), coalesce_key, shard)
+        if coalesce_key is not None:
+            self.coalescing[coalesce_key] = job
+        lane.queue.put_nowait((priority, next(self.seq), job))
+        try:
+            return await asyncio.shield(job.future)
+        finally:
+            if job.future.done():
+                lane.slots.release()
+            else:
+                job.future.add_done_callback(lambda _: lane.slots.release())
+
+    async def _worker(self, lane: _OutboundLane):
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await lane.queue.get()
+            job = entry[2]
+            buckets = [self._bucket(key) for key in job.buckets]
+            wait = max(b.delay() for b in buckets)
+            if wait > 0:
+                loop.call_later(wait, lane.queue.put_nowait, entry)
+                continue
+            for b in buckets:
+                b.take()
+            if job.coalesce_key is not None:
+                self.coalescing.pop(job.coalesce_key, None)
+            shard = str(job.shard)
+            metrics.inc("shop_api_calls_total", route=job.route, shard=shard)
+            start = time.perf_counter()
+            try:
+                result = await job.factory()
+            except Exception as e:
+                metrics.inc("shop_api_errors_total", route=job.route, shard=shard)
+                if isinstance(e, discord.RateLimited):
+                    metrics.inc("shop_api_ratelimited_total", route=job.route, shard=shard)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            metrics.observe("shop_api_seconds", time.perf_counter() - start, route=job.route, shard=shard)
+
+    async def send(self, channel, *args, priority: int = PRIORITY_NORMAL, **kwargs):
+        return await self.submit(
+            lambda: channel.send(*args, **kwargs), "messages.send", channel.id, channel.id, priority,
+            shard=channel_shard(channel)
+        )
+
+    async def edit(self, message, priority: int = PRIORITY_NORMAL, **kwargs):
+        return await self.submit(
+            lambda: message.edit(**kwargs), "messages.edit", message.channel.id, message.channel.id, priority,
+            coalesce_key=("edit", message.id), shard=channel_shard(message.channel)
+        )
+
+    async def fetch_message(self, channel, message_id: int, priority: int = PRIORITY_NORMAL):
+        return await self.submit(
+            lambda: channel.fetch_message(message_id), "messages.fetch", channel.id, channel.id, priority,
+            shard=channel_shard(channel)
+        )
+
+    async def delete(self, message, priority: int = PRIORITY_NORMAL):
+        return await self.submit(
+            lambda: message.delete(), "messages.delete", message.channel.id, message.channel.id, priority,
+            shard=channel_shard(message.channel)
+        )
+
+    async def followup(self, interaction: discord.Interaction, *args, **kwargs):
+        return await self.submit(
+            lambda: interaction.followup.send(*args, **kwargs), "interactions.followup", interaction.id, None,
+            PRIORITY_INTERACTION, shard=shard_of(interaction.guild_id)
+        )
+
+    async def create_channel(self, guild, name: str, priority: int = PRIORITY_NORMAL, **kwargs):
+        return await self.submit(
+            lambda: guild.create_text_channel(name, **kwargs), "channels.create", guild.id, None, priority,
+            shard=shard_of(guild.id)
+        )
+
+    async def delete_channel(self, channel, priority: int = PRIORITY_NORMAL):
+        return await self.submit(
+            lambda: channel.delete(), "channels.delete", channel.guild.id, None, priority,
+            shard=shard_of(channel.guild.id)
+        )
+
+    async def edit_channel(self, channel, priority: int = PRIORITY_NORMAL, **kwargs):
+        """Rename/topic/permission edits; Discord allows two renames per channel per 10 minutes."""
+        return await self.submit(
+            lambda: channel.edit(**kwargs), "channels.edit", channel.id, None, priority,
+            shard=shard_of(channel.guild.id)
+        )
+
+
+outbound = OutboundDispatcher()
+
+
+class TicketChannels:
+    """Lifecycle of the one channel a purchase lives in.
+
+    open() gives a shopper their private shop channel: a pre-created hidden
+    channel from the guild's warm pool when there is one (a single edit),
+    a new channel otherwise, or a private thread under `parent` in thread
+    mode. to_ticket() turns that same channel into the order ticket in place
+    by renaming it and resetting its topic and permissions, and close()
+    deletes it (threads are archived and locked). One purchase therefore
+    costs at most one channel create and one delete, and with a warm pool
+    the create happens ahead of time at bulk priority.
+    """
+
+    POOL_PREFIX = "shop-ready-"
+
+    def __init__(self, mode: str, parent: str, pool_size: int):
+        self.mode = mode
+        self.parent = parent
+        self.pool_size = pool_size if mode != "thread" else 0
+        self.pools = {}       # guild id -> [channel id]
+        self.filling = set()  # guild ids with a refill running
+
+    @staticmethod
+    def overwrites(guild, member=None) -> dict:
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True)
+        }
+        if member is not None:
+            overwrites[member] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+        return overwrites
+
+    def warm(self, guild):
+        """Pick up pool channels left from the last run and top the pool up in the background."""
+        if not self.pool_size:
+            return
+        pool = self.pools.setdefault(guild.id, [])
+        for channel in guild.text_channels:
+            if channel.name.startswith(self.POOL_PREFIX) and channel.id not in pool:
+                pool.append(channel.id)
+        self.refill(guild)
+
+    def refill(self, guild):
+        if self.pool_size and guild.id not in self.filling:
+            self.filling.add(guild.id)
+            asyncio.create_task(self._fill(guild))
+
+    async def _fill(self, guild):
+        try:
+            pool = self.pools.setdefault(guild.id, [])
+            while len(pool) < self.pool_size:
+                channel = await outbound.create_channel(
+                    guild, f"{self.POOL_PREFIX}{os.urandom(3).hex()}", priority=PRIORITY_BULK,
+                    overwrites=self.overwrites(guild)
+                )
+                pool.append(channel.id)
+        except discord.HTTPException as e:
+            print(f"⚠️ Could not fill the ticket channel pool in {guild.name}: {e}")
+        finally:
+            self.filling.discard(guild.id)
+
+    def _take(self, guild):
+        pool = self.pools.get(guild.id, [])
+        while pool:
+            channel = guild.get_channel(pool.pop(0))
+            if channel is not None:
+                return channel
+        return None
+
+    async def open(self, guild, member, name: str, topic: str):
+        if self.mode == "thread":
+            parent = discord.utils.get(guild.text_channels, name=self.parent)
+            if parent is not None:
+                thread = await outbound.submit(
+                    lambda: parent.create_thread(
+                        name=name, type=discord.ChannelType.private_thread, invitable=False,
+                        auto_archive_duration=10080
+                    ),
+                    "threads.create", parent.id, parent.id, PRIORITY_INTERACTION, shard=shard_of(guild.id)
+                )
+                await outbound.submit(
+                    lambda: thread.add_user(member), "threads.members", thread.id, None, PRIORITY_INTERACTION,
+                    shard=shard_of(guild.id)
+                )
+                return thread
+
+        channel = self._take(guild)
+        if self.pool_size:
+            metrics.inc("shop_ticket_pool_total", result="hit" if channel else "miss")
+            self.refill(guild)
+        if channel is not None:
+            edited = await outbound.edit_channel(
+                channel, PRIORITY_INTERACTION, name=name, topic=topic, overwrites=self.overwrites(guild, member)
+            )
+            return edited or channel
+        return await outbound.create_channel(
+            guild, name, priority=PRIORITY_INTERACTION, overwrites=self.overwrites(guild, member), topic=topic
+        )
+
+    async def to_ticket(self, channel, guild, member, name: str, topic: str):
+        """Turn the shop channel into the order ticket; opens a fresh one if it is gone."""
+        if channel is None:
+            return await self.open(guild, member, name, topic)
+        if isinstance(channel, discord.Thread):
+            return await outbound.edit_channel(channel, PRIORITY_INTERACTION, name=name) or channel
+        edited = await outbound.edit_channel(
+            channel, PRIORITY_INTERACTION, name=name, topic=topic, overwrites=self.overwrites(guild, member)
+        )
+        return edited or channel
+
+    async def close(self, channel, priority: int = PRIORITY_NORMAL):
+        if isinstance(channel, discord.Thread):
+            await outbound.submit(
+                lambda: channel.edit(archived=True, locked=True), "threads.edit", channel.id, None, priority,
+                shard=shard_of(channel.guild.id)
+            )
+        else:
+            await outbound.delete_channel(channel, priority)
+
+    def pooled(self) -> int:
+        return sum(len(pool) for pool in self.pools.values())
+
+
+ticket_channels = TicketChannels(TICKET_MODE, TICKET_THREAD_PARENT, TICKET_POOL_SIZE)
+
+
+class StockReservations:
+    """Per-item stock holds and all-or-nothing checkout.
+
+    Add to Cart places a hold on one unit for the shopper, which expires after
+    `ttl` seconds unless it is refreshed or committed. Checkout locks only the
+    items in the cart (in a fixed order, so two checkouts cannot deadlock),
+    checks stock against everyone else's holds and writes the decrements as
+    stock deltas. Unrelated items never wait on each other.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.locks = {}     # (server, category, item) -> asyncio.Lock
+        self.users = {}     # (server, category, item) -> coroutines holding or waiting for its lock
+        self.holds = {}     # (server, category, item) -> {owner: [qty, expires]}
+        self.owned = {}     # owner -> set of item keys with a hold
+
+    @contextlib.asynccontextmanager
+    async def _locked(self, keys):
+        """Hold the locks of keys, taken in sorted order so two callers cannot deadlock.
+
+        Every key is counted as in use before the first await, so prune() never
+        drops a lock that someone is about to acquire.
+        """
+        keys = sorted(set(keys))
+        for key in keys:
+            self.users[key] = self.users.get(key, 0) + 1
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                for key in keys:
+                    lock = self.locks.get(key)
+                    if lock is None:
+                        lock = self.locks[key] = asyncio.Lock()
+                    await stack.enter_async_context(lock)
+                yield
+        finally:
+            for key in keys:
+                self.users[key] -= 1
+                if not self.users[key]:
+                    del self.users[key]
+
+    def _live(self, key) -> dict:
+        holds = self.holds.get(key, {})
+        now = time.monotonic()
+        for owner in [o for o, (_, expires) in holds.items() if expires <= now]:
+            self._drop(key, owner)
+        return self.holds.get(key, {})
+
+    def _drop(self, key, owner):
+        holds = self.holds.get(key)
+        if holds and holds.pop(owner, None) and not holds:
+            del self.holds[key]
+        keys = self.owned.get(owner)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.owned[owner]
+
+    def reserved(self, server: str, category: str, item: str, exclude=None) -> int:
+        holds = self._live((server, category, item))
+        return sum(qty for owner, (qty, _) in holds.items() if owner != exclude)
+
+    async def hold(self, server: str, category: str, item: str, owner, qty: int = 1) -> bool:
+        key = (server, category, item)
+        async with self._locked([key]):
+            info = (await storage.load(server)).get(category, {}).get(item)
+            if not info or info.get("stock", 0) - self.reserved(*key) < qty:
+                return False
+            held = self._live(key).get(owner, [0, 0])[0]
+            self.holds.setdefault(key, {})[owner] = [held + qty, time.monotonic() + self.ttl]
+            self.owned.setdefault(owner, set()).add(key)
+            return True
+
+    async def reduce(self, server: str, category: str, item: str, owner, qty: int = 1):
+        key = (server, category, item)
+        held = self.holds.get(key, {}).get(owner)
+        if held:
+            held[0] -= qty
+            if held[0] <= 0:
+                self._drop(key, owner)
+
+    async def restore_carts(self, carts: Mapping):
+        """Re-place the holds of {owner: Cart} without checking stock (used for carts restored at startup)."""
+        for owner, cart in carts.items():
+            for line in cart:
+                key = (cart.server, line.category, line.name)
+                self.holds.setdefault(key, {})[owner] = [line.quantity, time.monotonic() + self.ttl]
+                self.owned.setdefault(owner, set()).add(key)
+
+    async def release(self, owner, server: str = None):
+        for key in list(self.owned.get(owner, ())):
+            if server is None or key[0] == server:
+                self._drop(key, owner)
+
+    async def prune(self):
+        """Forget expired holds and the locks of items nobody holds, waits for or is checking out."""
+        for key in list(self.holds):
+            self._live(key)
+        for key in [k for k in self.locks if k not in self.users and k not in self.holds]:
+            del self.locks[key]
+
+    async def commit(self, server: str, owner, lines: Mapping):
+        """Take {(category, item): qty} out of stock for owner.
+
+        Returns None on success or a message explaining why nothing was taken.
+        """
+        keys = sorted((server, category, item) for category, item in lines)
+        async with self._locked(keys):
+            inventory = await storage.load(server)
+            for key in keys:
+                _, category, item = key
+                info = inventory.get(category, {}).get(item)
+                if not info:
+                    return f"⚠️ Item `{item}` in category `{category}` no longer exists in the inventory."
+                left = info.get("stock", 0) - self.reserved(*key, exclude=owner)
+                if left < lines[(category, item)]:
+                    return f"⚠️ Only {max(left, 0)}x `{item}` left in stock."
+
+            taken = []
+            for key in keys:
+                qty = lines[key[1:]]
+                if not await storage.adjust_stock(server, key[1], key[2], -qty):
+                    await self.restock(server, dict(taken))
+                    return f"⚠️ Item `{key[2]}` in category `{key[1]}` no longer exists in the inventory."
+                taken.append((key[1:], qty))
+
+            for key in keys:
+                self._drop(key, owner)
+        return None
+
+    async def restock(self, server: str, lines: Mapping):
+        for (category, item), qty in lines.items():
+            await storage.adjust_stock(server, category, item, qty)
+
+    async def exclusive(self, server: str, items, func, *args):
+        """Run func(*args) on the storage pool while no checkout can touch the (category, item) pairs in items."""
+        async with self._locked((server, category, item) for category, item in items):
+            return await storage.run(func, *args)
+
+
+class SharedStockReservations(StockReservations):
+    """StockReservations for several processes: holds live in the shared state
+    database, and hold() and commit() run inside its cross-process lock, so the
+    stock check and the hold or stock decrement cannot interleave with another
+    process doing the same. Every write runs on the storage pool, since taking
+    the lock can wait on another process.
+    """
+
+    def __init__(self, ttl: int, state: SqliteState):
+        super().__init__(ttl)
+        self.state = state
+
+    def reserved(self, server: str, category: str, item: str, exclude=None) -> int:
+        return self.state.reserved((server, category, item), exclude)
+
+    async def hold(self, server: str, category: str, item: str, owner, qty: int = 1) -> bool:
+        return await storage.run(self._hold, (server, category, item), owner, qty)
+
+    def _hold(self, key: tuple, owner, qty: int) -> bool:
+        with self.state.lock():
+            info = load_inventory(key[0]).get(key[1], {}).get(key[2])
+            if not info or info.get("stock", 0) - self.state.reserved(key) < qty:
+                return False
+            self.state.add_hold(key, owner, qty, time.time() + self.ttl)
+            return True
+
+    async def reduce(self, server: str, category: str, item: str, owner, qty: int = 1):
+        await storage.run(self.state.reduce_hold, (server, category, item), owner, qty)
+
+    async def restore_carts(self, carts: Mapping):
+        if carts:
+            await storage.run(self._restore_carts, carts)
+
+    def _restore_carts(self, carts: Mapping):
+        expires = time.time() + self.ttl
+        with self.state.lock():
+            for owner, cart in carts.items():
+                for line in cart:
+                    self.state.set_hold((cart.server, line.category, line.name), owner, line.quantity, expires)
+
+    async def release(self, owner, server: str = None):
+        await storage.run(self.state.release, owner, server)
+
+    async def commit(self, server: str, owner, lines: Mapping):
+        return await storage.run(self._commit, server, owner, lines)
+
+    def _commit(self, server: str, owner, lines: Mapping):
+        with self.state.lock():
+            inventory = load_inventory(server)  # stamp-checked, so it includes other processes' sales
+            for (category, item), qty in sorted(lines.items()):
+                info = inventory.get(category, {}).get(item)
+                if not info:
+                    return f"⚠️ Item `{item}` in category `{category}` no longer exists in the inventory."
+                left = info.get("stock", 0) - self.state.reserved((server, category, item), exclude=owner)
+                if left < qty:
+                    return f"⚠️ Only {max(left, 0)}x `{item}` left in stock."
+            taken = []
+            for (category, item), qty in sorted(lines.items()):
+                if not inventory_adjust_stock(server, category, item, -qty):
+                    for (c, i), q in taken:
+                        inventory_adjust_stock(server, c, i, q)
+                    return f"⚠️ Item `{item}` in category `{category}` no longer exists in the inventory."
+                taken.append(((category, item), qty))
+            self.state.release(owner, server)
+        return None
+
+    async def prune(self):
+        await storage.run(self.state.prune)
+
+    async def exclusive(self, server: str, items, func, *args):
+        # Checkouts in every process commit inside the state lock, so holding it covers every item.
+        return await storage.run(self._exclusive, func, args)
+
+    def _exclusive(self, func, args):
+        with self.state.lock():
+            return func(*args)
+
+
+reservations = (
+    SharedStockReservations(RESERVATION_TTL, shared_state) if shared_state.shared
+    else StockReservations(RESERVATION_TTL)
+)
+
+
+class CartLine:
+    __slots__ = ("category", "name", "quantity", "unit_price")
+
+    def __init__(self, category: str, name: str, quantity: int, unit_price: float):
+        self.category = category
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+
+    @property
+    def subtotal(self) -> float:
+        return self.quantity * self.unit_price
+
+
+class Cart:
+    """A shopper's cart: one CartLine per (category, item) and a running total.
+
+    Clicking Add to Cart again bumps a quantity instead of growing a list, so
+    memory and rendering cost depend only on the number of distinct items.
+    """
+
+    __slots__ = ("server", "lines", "total", "version", "rendered")
+
+    def __init__(self, server: str = None):
+        self.server = server
+        self.lines = {}
+        self.total = 0.0
+        self.version = 0  # bumped on every change, so cart_embed can reuse its last render
+        self.rendered = None
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def get(self, category: str, name: str):
+        return self.lines.get((category, name))
+
+    def add(self, category: str, name: str, unit_price: float, qty: int = 1) -> CartLine:
+        line = self.lines.get((category, name))
+        if line is None:
+            line = self.lines[(category, name)] = CartLine(category, name, 0, float(unit_price))
+        line.quantity += qty
+        self.total += qty * line.unit_price
+        self.version += 1
+        return line
+
+    def remove(self, category: str, name: str, qty: int = None) -> int:
+        """Take qty units (the whole line if None) out of the cart and return how many were removed."""
+        line = self.lines.get((category, name))
+        if line is None:
+            return 0
+        qty = line.quantity if qty is None else min(qty, line.quantity)
+        line.quantity -= qty
+        self.total -= qty * line.unit_price
+        if not line.quantity:
+            del self.lines[(category, name)]
+        if not self.lines:
+            self.total = 0.0
+        self.version += 1
+        return qty
+
+    def clear(self):
+        self.lines.clear()
+        self.total = 0.0
+        self.version += 1
+
+    def take(self) -> "Cart":
+        """Move every line into a new Cart and leave this one empty."""
+        taken = Cart(self.server)
+        taken.lines, taken.total = self.lines, self.total
+        self.lines = {}
+        self.total = 0.0
+        self.version += 1
+        return taken
+
+    def put_back(self, taken: "Cart"):
+        """Undo take(), keeping anything added to the cart since."""
+        for line in taken:
+            self.add(line.category, line.name, line.unit_price, line.quantity)
+
+    def reprice(self, inventory: Mapping) -> list:
+        """Refresh unit prices from inventory; returns the lines whose item no longer exists."""
+        missing = []
+        total = 0.0
+        for line in self.lines.values():
+            info = inventory.get(line.category, {}).get(line.name)
+            if info is None:
+                missing.append(line)
+                continue
+            if line.unit_price != float(info['price']):
+                line.unit_price = float(info['price'])
+                self.version += 1
+            total += line.subtotal
+        self.total = total
+        return missing
+
+    def quantities(self) -> dict:
+        return {key: line.quantity for key, line in self.lines.items()}
 
 class ServerSelectView(discord.ui.View):
     def __init__(self, user_id: int):
         super().__init__(timeout=None)
-        for srv in SERVER_FILES.keys():
+        for srv in server_registry.names()[:25]:
             self.add_item(ServerButton(user_id, srv))
 
 class ServerButton(discord.ui.Button):
     def __init__(self, user_id: int, server_name: str):
-        super().__init__(label=server_name.title(), style=discord.ButtonStyle.primary)
+        super().__init__(
+            label=server_registry.label(server_name.lower()), style=discord.ButtonStyle.primary,
+            custom_id=f"shop:server:{user_id}:{server_name.lower()}"
+        )
         self.user_id = user_id
         self.server_name = server_name.lower()
 
@@ -343,38 +3055,42 @@ class ServerButton(discord.ui.Button):
         # Continue with your ticket creation logic as before
         guild = interaction.guild
         member = interaction.user
+        key = session_key(interaction)
 
-        existing_channel = user_tickets.get(member.id)
+        existing_channel = user_tickets.get(key)
         if existing_channel:
-            ticket_ch = guild.get_channel(existing_channel)
+            ticket_ch = guild.get_channel_or_thread(existing_channel)
             if ticket_ch:
                 await interaction.response.send_message(
                     f"📨 You already have a ticket: {ticket_ch.mention}", ephemeral=True
                 )
                 return
             else:
-                user_tickets.pop(member.id, None)
+                user_tickets.pop(key, None)
+                await storage.run(session_store.forget_channel, key)
+
+        # Channel creation can queue behind other guild traffic, so acknowledge first.
+        await interaction.response.defer(ephemeral=True, thinking=True)
 
         ticket_name = f"{self.server_name}-shop-{member.name}".lower().replace(" ", "-")
-        ticket_ch = await guild.create_text_channel(
-            ticket_name,
-            overwrites={
-                guild.default_role: discord.PermissionOverwrite(view_channel=False),
-                member: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-                guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True)
-            },
-            topic=f"Private shop channel for {member.name} on {self.server_name}"
+        ticket_ch = await ticket_channels.open(
+            guild, member, ticket_name, f"Private shop channel for {member.name} on {self.server_name}"
         )
 
-        user_tickets[member.id] = ticket_ch.id
-        user_carts[member.id] = {'server': self.server_name, 'items': []}
+        user_tickets[key] = ticket_ch.id
+        user_carts[key] = Cart(self.server_name)
+        await reservations.release(key)
+        await storage.run(session_store.save_session, key, self.server_name, ticket_ch.id)
 
-        await ticket_ch.send(
+        await outbound.send(
+            ticket_ch,
             f"👋 Welcome {member.mention}! You are now shopping in **{self.server_name.title()}**.",
-            view=HomeView(member.id)
+            view=HomeView(member.id),
+            priority=PRIORITY_INTERACTION
         )
 
-        await interaction.response.send_message(
+        await outbound.followup(
+            interaction,
             f"✅ Your private shop channel has been created: {ticket_ch.mention}",
             ephemeral=True
         )
@@ -387,145 +3103,937 @@ class HomeView(discord.ui.View):
         self.add_item(ViewCartButton(user_id))
         self.add_item(ConfirmOrderButton(user_id))
 
-class ViewItemsButton(discord.ui.Button):
+class ViewItemsButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:items:(?P<user_id>\d+)"):
     def __init__(self, user_id: int):
-        super().__init__(label="🛍️ View Items", style=discord.ButtonStyle.primary)
+        super().__init__(discord.ui.Button(
+            label="🛍️ View Items", style=discord.ButtonStyle.primary, custom_id=f"shop:items:{user_id}"
+        ))
         self.user_id = user_id
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["user_id"]))
+
     async def callback(self, interaction: discord.Interaction):
-        cart = user_carts.get(self.user_id)
-        if not cart or not cart.get('server'):
+        cart = user_carts.get(session_key(interaction, self.user_id))
+        if cart is None or not cart.server:
             await interaction.response.send_message("❌ Please select a server first with `/shop`.", ephemeral=True)
             return
-        server = cart['server']
-        inventory = load_inventory(server)
+        server = cart.server
+        inventory = await storage.load(server)
         if not inventory:
             await interaction.response.send_message("❌ No items in this shop yet.", ephemeral=True)
             return
         await interaction.response.send_message(
-            "📂 **Select a category:**", view=CategoryListView(self.user_id, server)
+            "📂 **Select a category:**", view=CategoryListView(self.user_id, server, category_layout(server, inventory))
         )
 
+def category_layout(server: str, inventory: Mapping) -> list:
+    """(category, button style) pairs in display order, cached until the category set changes."""
+    key = ("layout", server)
+    layout = render_cache.get(key, inventory)
+    if layout is None:
+        layout = [
+            (category, CATEGORY_COLORS.get(category.lower(), discord.ButtonStyle.secondary))
+            for category in sorted(inventory)  # sort alphabetically
+        ]
+        render_cache.put(key, inventory, layout)
+    return layout
+
+
 class CategoryListView(discord.ui.View):
-    def __init__(self, user_id: int, server: str):
+    def __init__(self, user_id: int, server: str, layout: list):
+        super().__init__(timeout=None)
+        self.user_id = user_id
+        self.server = server
+
+        for category, style in layout:
+            self.add_item(CategoryButton(user_id, server, category, style))
+
+        self.add_item(BackToHomeButton(user_id))
+
+
+
+class CategoryButton(discord.ui.DynamicItem[discord.ui.Button],
+                     template=r"shop:category:(?P<user_id>\d+):(?P<server>[\w-]+):(?P<category>[0-9a-f]{8,16})"):
+    def __init__(self, user_id: int, server: str, category: str, style):
+        super().__init__(discord.ui.Button(
+            label=f"{(category or '').title()}"[:80], style=discord.ButtonStyle.primary,
+            custom_id=f"shop:category:{user_id}:{server}:{short_key(category or '')}"
+        ))
+        self.user_id = user_id
+        self.server = server
+        self.category = category
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        category = find_key((await storage.load(match["server"])).keys(), match["category"])
+        return cls(int(match["user_id"]), match["server"], category, None)
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You cannot access this button.", ephemeral=True)
+            return
+
+        if self.category is None:
+            await interaction.response.send_message("❌ This category no longer exists.", ephemeral=True)
+            return
+
+        await show_catalog_page(interaction, self.user_id, self.server, self.category, 0)
+
+
+class RenderCache:
+    """Prebuilt embeds and layouts, reused until the inventory data under them changes.
+
+    Each entry remembers the frozen inventory object it was built from and is
+    only served while load_inventory still hands out that same object. Since
+    reloads keep unchanged categories and items identical, an edit only
+    invalidates what it touched. Cached embeds are shared: copy before
+    changing one.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, source):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is source:
+            self.entries.move_to_end(key)
+            metrics.inc("shop_render_cache_total", result="hit")
+            return entry[1]
+        metrics.inc("shop_render_cache_total", result="miss")
+        return None
+
+    def put(self, key, source, value):
+        self.entries[key] = (source, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def drop(self, server: str):
+        for key in [key for key in self.entries if key[1] == server]:
+            del self.entries[key]
+
+
+render_cache = RenderCache()
+
+
+CATALOG_PAGE_SIZE = 10  # Discord caps a message at 10 embeds
+
+
+def in_stock(items: Mapping, server: str = None, category: str = None) -> list:
+    # ✅ Filter out items with stock <= 0
+    key = ("in_stock", server, category)
+    cached = render_cache.get(key, items) if server else None
+    if cached is None:
+        cached = [(name, info) for name, info in items.items() if info.get("stock", 0) > 0]
+        if server:
+            render_cache.put(key, items, cached)
+    return cached
+
+
+def item_embed(item_name: str, info: Mapping, files: list = None, server: str = "", category: str = "",
+               image: str = None) -> discord.Embed:
+    """An item's embed, cached per item.
+
+    Pass files to let expired image links be served from image_cache, or image
+    when the link has already been resolved that way.
+    """
+    url = image if image is not None else info.get('image') or ""
+    if image is None and url and files is not None:
+        url = image_cache.attach(url, files)
+    key = ("item", server, category, item_name, url)
+    embed = render_cache.get(key, info)
+    if embed is None:
+        embed = discord.Embed(
+            title=item_name,
+            description=f"💲 ${info['price']:.2f}\n📦 Stock: {info['stock']}",
+            color=discord.Color.blue()
+        )
+        if url:
+            embed.set_image(url=url)
+        render_cache.put(key, info, embed)
+    return embed
+
+
+_IMAGE_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/webp": ".webp"}
+IMAGE_MAX_BYTES = 8 * 1024 * 1024
+
+
+class ImageCache:
+    """Item images, downloaded once and kept on disk under their SHA-256.
+
+    index.json maps each image URL (minus Discord's expiring ex/is/hm query) to
+    the file holding its bytes, so identical images share one file. While a
+    link is live embeds keep using it; once it has expired or stopped
+    answering, attach() serves the cached copy as an attachment instead.
+    """
+
+    EXPIRING_PARAMS = ("ex", "is", "hm")
+
+    def __init__(self, directory: str, concurrency: int):
+        self.directory = directory
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+        self.lock = threading.Lock()
+        self.broken = set()
+        self._inflight = {}
+        self._tasks = set()
+        self.index = {}
+        try:
+            with open(self._index_path(), "r") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    @classmethod
+    def url_key(cls, url: str) -> str:
+        parts = urlsplit(url)
+        query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k not in cls.EXPIRING_PARAMS])
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+    @staticmethod
+    def expired(url: str) -> bool:
+        ex = dict(parse_qsl(urlsplit(url).query)).get("ex")
+        try:
+            return ex is not None and int(ex, 16) <= time.time()
+        except ValueError:
+            return False
+
+    def path(self, url: str):
+        name = self.index.get(self.url_key(url))
+        if name:
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def attach(self, url: str, files: list) -> str:
+        """Return the URL an embed should show for url, adding the cached file to files if the link is dead."""
+        if not url or not (self.expired(url) or self.url_key(url) in self.broken):
+            return url
+        path = self.path(url)
+        if path is None:
+            metrics.inc("shop_image_cache_total", result="miss")
+            return url
+        metrics.inc("shop_image_cache_total", result="served")
+        name = os.path.basename(path)
+        if all(f.filename != name for f in files):
+            files.append(discord.File(path, filename=name))
+        return f"attachment://{name}"
+
+    async def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self.session
+
+    async def fetch(self, url: str):
+        """Return the cached file for url, downloading it first if needed (None if it can't be fetched)."""
+        if not url:
+            return None
+        cached = self.path(url)
+        if cached:
+            return cached
+        key = self.url_key(url)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._download(url, key))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await task
+
+    def schedule(self, url: str):
+        if url and not self.path(url):
+            task = asyncio.ensure_future(self.fetch(url))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _download(self, url: str, key: str):
+        async with self.semaphore:
+            try:
+                session = await self._session()
+                async with session.get(url) as resp:
+                    if resp.status != 200:
+                        if 400 <= resp.status < 500:
+                            self.broken.add(key)
+                        print(f"⚠️ Image {url} answered {resp.status}")
+                        return None
+                    data = await resp.content.read(IMAGE_MAX_BYTES + 1)
+                    content_type = resp.content_type
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"⚠️ Could not fetch image {url}: {e}")
+                return None
+        if len(data) > IMAGE_MAX_BYTES:
+            print(f"⚠️ Image {url} is larger than {IMAGE_MAX_BYTES} bytes, not caching it")
+            return None
+
+        ext = _IMAGE_EXTENSIONS.get(content_type) or os.path.splitext(urlsplit(url).path)[1][:5] or ".img"
+        name = hashlib.sha256(data).hexdigest() + ext
+        path = await storage.run(self._store, key, name, data)
+        metrics.inc("shop_image_cache_total", result="downloaded")
+        self.broken.discard(key)
+        return path
+
+    def _store(self, key: str, name: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        if not os.path.isfile(path):  # identical bytes under another URL are stored once
+            _write_atomic(path, data)
+        with self.lock:
+            self.index[key] = name
+            _write_atomic(self._index_path(), json.dumps(self.index, indent=1).encode())
+        return path
+
+    async def validate(self, urls) -> tuple:
+        """Cache every url that isn't cached yet; returns (cached, total)."""
+        unique = {self.url_key(url): url for url in urls if url}
+        results = await asyncio.gather(*(self.fetch(url) for url in unique.values()))
+        return sum(1 for path in results if path), len(results)
+
+    async def validate_forever(self):
+        while True:
+            try:
+                urls = []
+                for server in list(_inventory_cache):  # loaded inventories only; idle servers stay unloaded
+                    urls.extend(info.get("image") for items in (await storage.load(server)).values()
+                                for info in items.values())
+                cached, total = await self.validate(urls)
+                print(f"🖼️ Image cache: {cached}/{total} item images cached")
+            except Exception as e:
+                print(f"⚠️ Image validation failed: {e}")
+            await asyncio.sleep(IMAGE_VALIDATE_INTERVAL)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_FETCH_CONCURRENCY)
+
+
+async def add_to_cart(key: tuple, server: str, item_name: str, category: str) -> bool:
+    info = (await storage.load(server)).get(category, {}).get(item_name)
+    if not info or not await reservations.hold(server, category, item_name, owner=key):
+        return False
+    cart = user_carts.get(key)
+    if cart is None:
+        cart = user_carts[key] = Cart(server)
+    line = cart.add(category, item_name, info['price'])
+    await storage.run(session_store.save_line, key, cart.server, line)
+    return True
+
+
+def short_key(name: str) -> str:
+    """Stable 16-hex-digit id for a category or item name, short enough for a custom_id.
+
+    64 bits keep collisions out of reach even in categories with tens of
+    thousands of items; 8 digits (the old length) collided at a few thousand.
+    """
+    return hashlib.sha1(name.encode()).hexdigest()[:16]
+
+
+def find_key(names, key: str):
+    # Prefix match, so components posted with the old 8-digit ids still resolve.
+    return next((name for name in names if short_key(name)[:len(key)] == key), None)
+
+
+_CATALOG_ID = r"(?P<user_id>\d+):(?P<server>[\w-]+):(?P<category>[0-9a-f]{8,16})"
+
+
+class CatalogView(discord.ui.View):
+    """One message per category browse: a page of item embeds plus paging controls.
+
+    Paging edits the message in place, so browsing costs one API call per click
+    no matter how many items the category holds. Every control carries its
+    user/server/category/page in its custom_id, so the message keeps working
+    across restarts.
+    """
+
+    def __init__(self, user_id: int, server: str, category: str, items: list, page: int = 0):
         super().__init__(timeout=None)
         self.user_id = user_id
         self.server = server
+        self.category = category
+        self.items = items
+        self.page = min(max(page, 0), self.page_count - 1)
+
+        ids = (user_id, server, category)
+        if self.page_items():
+            self.add_item(CatalogAddToCartSelect(*ids, self.page_items()))
+        self.add_item(CatalogPageButton(*ids, self.page, "prev", disabled=self.page == 0))
+        self.add_item(CatalogJumpButton(*ids, f"Page {self.page + 1}/{self.page_count}",
+                                        disabled=self.page_count == 1))
+        self.add_item(CatalogPageButton(*ids, self.page, "next", disabled=self.page >= self.page_count - 1))
+        self.add_item(BackToHomeButton(user_id))
 
-        categories = sorted(load_inventory(server).keys())  # sort alphabetically
+    @property
+    def page_count(self) -> int:
+        return max(1, (len(self.items) + CATALOG_PAGE_SIZE - 1) // CATALOG_PAGE_SIZE)
+
+    def page_items(self) -> list:
+        start = self.page * CATALOG_PAGE_SIZE
+        return self.items[start:start + CATALOG_PAGE_SIZE]
+
+    def header(self) -> str:
+        return f"🛍️ **{self.category}** — page {self.page + 1}/{self.page_count}"
+
+    def signature(self) -> tuple:
+        """What the message shows; equal signatures render identically."""
+        return self.page, self.page_count, tuple(self.page_items())
+
+    def render(self, source: Mapping = None):
+        """Return (embeds, files) for the current page; source is the category it was built from."""
+        # Image links are resolved first: once one expires or breaks it becomes an
+        # attachment, so the page built from the live links must not be reused.
+        files = []
+        images = [image_cache.attach(info.get('image') or "", files) for _, info in self.page_items()]
+        key = ("page", self.server, self.category, self.page, tuple(images))
+        embeds = render_cache.get(key, source) if source is not None and not files else None
+        if embeds is not None:
+            return embeds, []
+        embeds = [
+            item_embed(name, info, files, self.server, self.category, image)
+            for (name, info), image in zip(self.page_items(), images)
+        ]
+        if source is not None and not files:  # attachments are single-use, so those pages aren't kept
+            render_cache.put(key, source, embeds)
+        return embeds, files
 
-        for category in categories:
-            style = CATEGORY_COLORS.get(category.lower(), discord.ButtonStyle.secondary)
-            self.add_item(CategoryButton(user_id, server, category, style))
 
-        self.add_item(BackToHomeButton(user_id))
+async def show_catalog_page(interaction: discord.Interaction, user_id: int, server: str, category: str, page: int):
+    # Re-read the category so the stock shown is current.
+    source = (await storage.load(server)).get(category, {})
+    items = in_stock(source, server, category)
+    if not items:
+        await interaction.response.send_message("❌ No available items in this category.", ephemeral=True)
+        return
+    view = CatalogView(user_id, server, category, items, page)
+    embeds, files = view.render(source)
+    await interaction.response.edit_message(content=view.header(), embeds=embeds, attachments=files, view=view)
+    if interaction.message is not None:
+        live_catalogs.watch(interaction.message.id, interaction.channel_id, view)
+
+
+class _LiveCatalog:
+    __slots__ = ("channel_id", "user_id", "server", "category", "page", "shown", "until")
+
+    def __init__(self, channel_id: int, view: CatalogView, ttl: float):
+        self.channel_id = channel_id
+        self.user_id = view.user_id
+        self.server = view.server
+        self.category = view.category
+        self.page = view.page
+        self.shown = view.signature()
+        self.until = time.monotonic() + ttl
+
+
+class LiveCatalogs:
+    """Catalog messages that follow stock and price changes.
+
+    show_catalog_page() registers the message it renders. Inventory events mark
+    the messages showing that server and category stale; delay seconds after
+    the first one, each stale message is re-rendered and edited once, however
+    many events arrived in between, and not at all if its page looks the same.
+    A message stops following once it has gone ttl seconds without being paged,
+    shows something else, or is gone.
+    """
+
+    def __init__(self, delay: float, ttl: float, max_entries: int = 10000):
+        self.delay = delay
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.messages = collections.OrderedDict()  # message id -> _LiveCatalog, oldest first
+        self.by_category = {}  # (server, category) -> message ids
+        self.stale = set()
+        self.flushing = None
+
+    def watch(self, message_id: int, channel_id: int, view: CatalogView):
+        self.forget(message_id)
+        entry = self.messages[message_id] = _LiveCatalog(channel_id, view, self.ttl)
+        self.by_category.setdefault((entry.server, entry.category), set()).add(message_id)
+        now = time.monotonic()
+        while self.messages:
+            oldest = next(iter(self.messages))
+            if len(self.messages) <= self.max_entries and self.messages[oldest].until > now:
+                break
+            self.forget(oldest)
+
+    def forget(self, message_id: int):
+        entry = self.messages.pop(message_id, None)
+        if entry is None:
+            return
+        ids = self.by_category.get((entry.server, entry.category))
+        ids.discard(message_id)
+        if not ids:
+            del self.by_category[(entry.server, entry.category)]
+        self.stale.discard(message_id)
+
+    def on_event(self, event: InventoryEvent):
+        if event.category is None:
+            ids = [i for (server, _), ids in self.by_category.items() if server == event.server for i in ids]
+        else:
+            ids = self.by_category.get((event.server, event.category), ())
+        if not ids:
+            return
+        self.stale.update(ids)
+        if self.flushing is None:
+            self.flushing = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        await asyncio.sleep(self.delay)
+        self.flushing = None  # events from here on start the next round
+        stale, self.stale = self.stale, set()
+        await asyncio.gather(*(self.refresh(message_id) for message_id in stale))
+
+    async def refresh(self, message_id: int):
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return
+        channel = bot.get_channel(entry.channel_id)
+        if channel is None or entry.until < time.monotonic():
+            self.forget(message_id)
+            metrics.inc("shop_live_catalog_edits_total", result="expired")
+            return
+        source = (await storage.load(entry.server)).get(entry.category, {})
+        if self.messages.get(message_id) is not entry:
+            return  # paged or left meanwhile; that edit already shows current stock
+        items = in_stock(source, entry.server, entry.category)
+        view = CatalogView(entry.user_id, entry.server, entry.category, items, entry.page)
+        if view.signature() == entry.shown:
+            metrics.inc("shop_live_catalog_edits_total", result="unchanged")
+            return
+        embeds, files = view.render(source)
+        content = view.header() if items else f"❌ **{entry.category}** is sold out right now."
+        try:
+            await outbound.edit(
+                channel.get_partial_message(message_id), priority=PRIORITY_BULK,
+                content=content, embeds=embeds, attachments=files, view=view
+            )
+        except (discord.NotFound, discord.Forbidden):
+            self.forget(message_id)
+            metrics.inc("shop_live_catalog_edits_total", result="gone")
+            return
+        except discord.HTTPException as e:
+            print(f"⚠️ Could not refresh catalog message {message_id}: {e}")
+            metrics.inc("shop_live_catalog_edits_total", result="error")
+            return
+        entry.page, entry.shown = view.page, view.signature()
+        metrics.inc("shop_live_catalog_edits_total", result="edited")
 
 
+live_catalogs = LiveCatalogs(CATALOG_REFRESH_DELAY, LIVE_CATALOG_TTL)
+inventory_events.subscribe(live_catalogs.on_event)
 
-class CategoryButton(discord.ui.Button):
-    def __init__(self, user_id: int, server: str, category: str, style):
-        super().__init__(label=f"{category.title()}", style=discord.ButtonStyle.primary)
-        self.user_id = user_id
-        self.server = server
-        self.category = category
 
-    async def callback(self, interaction: discord.Interaction):
+class _CatalogItem:
+    """Shared parsing for the catalog controls' custom_ids."""
+
+    @staticmethod
+    async def resolve(match):
+        category = find_key((await storage.load(match["server"])).keys(), match["category"])
+        return int(match["user_id"]), match["server"], category
+
+    async def check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("You cannot access this button.", ephemeral=True)
-            return
+            return False
+        if self.category is None:
+            await interaction.response.send_message("❌ This category no longer exists.", ephemeral=True)
+            return False
+        return True
+
+
+class CatalogPageButton(_CatalogItem, discord.ui.DynamicItem[discord.ui.Button],
+                        template=r"shop:page:(?P<direction>prev|next):" + _CATALOG_ID + r":(?P<page>\d+)"):
+    def __init__(self, user_id: int, server: str, category: str, page: int, direction: str, disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label="◀ Prev" if direction == "prev" else "Next ▶", style=discord.ButtonStyle.secondary,
+            disabled=disabled, row=1,
+            custom_id=f"shop:page:{direction}:{user_id}:{server}:{short_key(category or '')}:{page}"
+        ))
+        self.user_id = user_id
+        self.server = server
+        self.category = category
+        self.page = page
+        self.direction = direction
 
-        items = load_inventory(self.server).get(self.category, {})
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(*await cls.resolve(match), int(match["page"]), match["direction"])
 
-        # ✅ Filter out items with stock <= 0
-        available_items = {
-            item_name: info for item_name, info in items.items()
-            if info.get("stock", 0) > 0
-        }
+    async def callback(self, interaction: discord.Interaction):
+        if await self.check(interaction):
+            step = -1 if self.direction == "prev" else 1
+            await show_catalog_page(interaction, self.user_id, self.server, self.category, self.page + step)
+
+
+class CatalogJumpButton(_CatalogItem, discord.ui.DynamicItem[discord.ui.Button],
+                        template=r"shop:jump:" + _CATALOG_ID):
+    def __init__(self, user_id: int, server: str, category: str, label: str = "Page", disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label=label, style=discord.ButtonStyle.primary, disabled=disabled, row=1,
+            custom_id=f"shop:jump:{user_id}:{server}:{short_key(category or '')}"
+        ))
+        self.user_id = user_id
+        self.server = server
+        self.category = category
 
-        if not available_items:
-            await interaction.response.send_message("❌ No available items in this category.", ephemeral=True)
-            return
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(*await cls.resolve(match))
 
-        await interaction.response.defer(ephemeral=True)
+    async def callback(self, interaction: discord.Interaction):
+        if await self.check(interaction):
+            await interaction.response.send_modal(CatalogJumpModal(self.user_id, self.server, self.category))
 
-        for item_name, info in available_items.items():
-            embed = discord.Embed(
-                title=item_name,
-                description=f"💲 ${info['price']:.2f}\n📦 Stock: {info['stock']}",
-                color=discord.Color.blue()
-            )
-            if info.get('image'):
-                embed.set_image(url=info['image'])
 
-            view = discord.ui.View(timeout=None)
-            view.add_item(AddToCartButton(self.user_id, item_name, self.category))
+class CatalogJumpModal(discord.ui.Modal, title="Jump to Page"):
+    def __init__(self, user_id: int, server: str, category: str):
+        super().__init__()
+        self.user_id = user_id
+        self.server = server
+        self.category = category
+        self.page = discord.ui.TextInput(label="Page", placeholder="e.g., 2")
+        self.add_item(self.page)
 
-            await interaction.channel.send(embed=embed, view=view)
-            await asyncio.sleep(0.1)
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(self.page.value.strip()) - 1
+        except ValueError:
+            await interaction.response.send_message("❌ Invalid page number.", ephemeral=True)
+            return
+        await show_catalog_page(interaction, self.user_id, self.server, self.category, page)
 
-        await interaction.channel.send("🏠 Back to home:", view=HomeView(self.user_id))
 
+class CatalogAddToCartSelect(_CatalogItem, discord.ui.DynamicItem[discord.ui.Select],
+                             template=r"shop:add:" + _CATALOG_ID):
+    def __init__(self, user_id: int, server: str, category: str, items: list = ()):
+        options = [
+            discord.SelectOption(label=name[:100], value=short_key(name), description=f"${info['price']:.2f}")
+            for name, info in items
+        ]
+        super().__init__(discord.ui.Select(
+            placeholder="🛒 Add to Cart", options=options, row=0,
+            custom_id=f"shop:add:{user_id}:{server}:{short_key(category or '')}"
+        ))
+        self.user_id = user_id
+        self.server = server
+        self.category = category
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(*await cls.resolve(match))
 
+    async def callback(self, interaction: discord.Interaction):
+        if not await self.check(interaction):
+            return
+        items = (await storage.load(self.server)).get(self.category, {})
+        item_name = find_key(items.keys(), self.item.values[0])
+        key = session_key(interaction, self.user_id)
+        if item_name is None or not await add_to_cart(key, self.server, item_name, self.category):
+            await interaction.response.send_message(f"❌ **{item_name or 'That item'}** is out of stock.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"✅ **{item_name}** added to your cart.", ephemeral=True)
 
 
-class BackToHomeButton(discord.ui.Button):
+class BackToHomeButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:home:(?P<user_id>\d+)"):
     def __init__(self, user_id: int):
-        super().__init__(label="🔙 Back", style=discord.ButtonStyle.danger)
+        super().__init__(discord.ui.Button(
+            label="🔙 Back", style=discord.ButtonStyle.danger, custom_id=f"shop:home:{user_id}"
+        ))
         self.user_id = user_id
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["user_id"]))
+
     async def callback(self, interaction: discord.Interaction):
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("You cannot use this button.", ephemeral=True)
             return
 
+        if interaction.message is not None:
+            live_catalogs.forget(interaction.message.id)
         await interaction.response.edit_message(
             content="🏠 Back to home:",
+            embeds=[],
             view=HomeView(self.user_id)
         )
 
 
-class AddToCartButton(discord.ui.Button):
-    def __init__(self, user_id: int, item_name: str, category: str):
-        super().__init__(label="Add to Cart", style=discord.ButtonStyle.success)
+class ViewCartButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:cart:(?P<user_id>\d+)"):
+    def __init__(self, user_id: int):
+        super().__init__(discord.ui.Button(
+            label="🛒 View Cart", style=discord.ButtonStyle.secondary, custom_id=f"shop:cart:{user_id}"
+        ))
         self.user_id = user_id
-        self.item_name = item_name
-        self.category = category
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["user_id"]))
 
     async def callback(self, interaction: discord.Interaction):
-        cart = user_carts.setdefault(self.user_id, {'server': None, 'items': []})
-        cart['items'].append({'name': self.item_name, 'category': self.category})
-        await interaction.response.send_message(f"✅ **{self.item_name}** added to your cart.", ephemeral=True)
+        cart = user_carts.get(session_key(interaction, self.user_id))
+        if not cart:
+            await interaction.response.send_message("🛒 Your cart is empty.", ephemeral=True)
+            return
 
-class ViewCartButton(discord.ui.Button):
-    def __init__(self, user_id: int):
-        super().__init__(label="🛒 View Cart", style=discord.ButtonStyle.secondary)
+        await interaction.response.send_message(
+            embed=cart_embed(cart), view=CartView(self.user_id, cart), ephemeral=True
+        )
+
+
+def cart_embed(cart: Cart) -> discord.Embed:
+    # Re-rendered only when the cart changed since the last time it was shown.
+    if cart.rendered is not None and cart.rendered[0] == cart.version:
+        return cart.rendered[1]
+    if not cart:
+        embed = discord.Embed(title="🛒 Your Cart", description="Your cart is empty.", color=discord.Color.gold())
+    else:
+        desc = "".join(
+            f"**{line.name}** (in {line.category}) x{line.quantity} @ ${line.unit_price:.2f}\n" for line in cart
+        )
+        desc += f"\n💰 **Total: ${cart.total:.2f}**"
+        embed = discord.Embed(title="🛒 Your Cart", description=desc, color=discord.Color.gold())
+    cart.rendered = (cart.version, embed)
+    return embed
+
+
+class CartView(discord.ui.View):
+    """Quantity +/- and remove controls for one line of the cart at a time."""
+
+    def __init__(self, user_id: int, cart: Cart, selected: tuple = None):
+        super().__init__(timeout=None)
         self.user_id = user_id
+        self.cart = cart
+        self.selected = selected if selected in cart.lines else None
+        if cart:
+            self.add_item(CartLineSelect(cart, self.selected))
+        disabled = self.selected is None
+        self.add_item(CartQuantityButton("➕", 1, disabled))
+        self.add_item(CartQuantityButton("➖", -1, disabled))
+        self.add_item(CartQuantityButton("🗑️ Remove", None, disabled))
+
+    def current(self, interaction: discord.Interaction) -> Cart:
+        """The shopper's cart as it is now: the reaper or another process may have replaced
+        the one this view was built with."""
+        self.cart = user_carts.get(session_key(interaction, self.user_id)) or Cart(self.cart.server)
+        return self.cart
+
+    async def refresh(self, interaction: discord.Interaction):
+        cart = self.current(interaction)
+        view = CartView(self.user_id, cart, self.selected)
+        await interaction.response.edit_message(embed=cart_embed(cart), view=view)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You cannot use this cart.", ephemeral=True)
+            return False
+        return True
+
+
+class CartLineSelect(discord.ui.Select):
+    def __init__(self, cart: Cart, selected: tuple = None):
+        self.keys = list(cart.lines)[:25]
+        options = [
+            discord.SelectOption(
+                label=f"{line.name[:90]} x{line.quantity}", value=str(i),
+                description=line.category[:100], default=key == selected
+            )
+            for i, (key, line) in enumerate((key, cart.lines[key]) for key in self.keys)
+        ]
+        super().__init__(placeholder="Select an item to change", options=options, row=0)
 
     async def callback(self, interaction: discord.Interaction):
-        cart = user_carts.get(self.user_id, {})
-        items = cart.get('items', [])
-        if not items:
-            await interaction.response.send_message("🛒 Your cart is empty.", ephemeral=True)
-            return
+        self.view.selected = self.keys[int(self.values[0])]
+        await self.view.refresh(interaction)
 
-        server = cart.get('server')
-        inventory = load_inventory(server)
-        counts = Counter((item['name'], item['category']) for item in items)
-        desc = ""
-        total = 0.0
 
-        for (name, category), cnt in counts.items():
-            if category in inventory and name in inventory[category]:
-                price = inventory[category][name]['price']
-                total += price * cnt
-                desc += f"**{name}** (in {category}) x{cnt} @ ${price:.2f}\n"
+class CartQuantityButton(discord.ui.Button):
+    def __init__(self, label: str, step, disabled: bool):
+        style = discord.ButtonStyle.danger if step is None else discord.ButtonStyle.secondary
+        super().__init__(label=label, style=style, disabled=disabled, row=1)
+        self.step = step
+
+    async def callback(self, interaction: discord.Interaction):
+        view = self.view
+        cart = view.current(interaction)
+        category, name = view.selected
+        key = session_key(interaction, view.user_id)
+        if self.step == 1:
+            if not await add_to_cart(key, cart.server, name, category):
+                await interaction.response.send_message(f"❌ **{name}** is out of stock.", ephemeral=True)
+                return
+        else:
+            removed = cart.remove(category, name, None if self.step is None else 1)
+            await reservations.reduce(cart.server, category, name, key, removed)
+            line = cart.get(category, name) or CartLine(category, name, 0, 0.0)
+            await storage.run(session_store.save_line, key, cart.server, line)
+        await view.refresh(interaction)
+
+
+INLINE_TRANSCRIPT_LIMIT = 1900
+TRANSCRIPT_MAX_BYTES = 8 * 1024 * 1024  # transcript files stop growing here (Discord's upload limit)
+TRANSCRIPT_CHUNK_BYTES = 64 * 1024  # rendered text is written out in chunks of about this size
+
+
+class TranscriptExport:
+    """Streams a channel's history into an in-memory buffer, one message at a time.
+
+    Each close gets its own buffer and nothing touches the disk. The buffer is
+    capped at TRANSCRIPT_MAX_BYTES, more than Discord would accept as an upload
+    anyway: a longer history is cut off there with a note saying so, so a huge
+    ticket can't grow the process without bound. Rendered text is written (and
+    compressed) in chunks on the storage pool. Short plain-text transcripts are
+    also kept inline so they can be posted as a message the way they always were.
+    """
+
+    def __init__(self, channel, fmt: str = "txt", compress: bool = False):
+        self.channel = channel
+        self.fmt = fmt if fmt in ("txt", "html", "jsonl") else "txt"
+        self.compress = compress
+        self.buffer = io.BytesIO()
+        self.count = 0
+        self.truncated = False
+        self.inline = None
+        self._pending = []
+        self._pending_len = 0
+        self._inline_parts = [] if self.fmt == "txt" else None
+        self._inline_len = 0
+
+    def _write(self, text: str):
+        self._pending.append(text)
+        self._pending_len += len(text)
+        if self._inline_parts is not None:
+            self._inline_len += len(text)
+            if self._inline_len > INLINE_TRANSCRIPT_LIMIT:
+                self._inline_parts = None
             else:
-                desc += f"⚠️ **{name}** (in {category}) no longer exists\n"
+                self._inline_parts.append(text)
 
-        desc += f"\n💰 **Total: ${total:.2f}**"
-        embed = discord.Embed(title="🛒 Your Cart", description=desc, color=discord.Color.gold())
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+    async def _flush(self, sink):
+        if self._pending:
+            data = "".join(self._pending).encode("utf-8")
+            self._pending, self._pending_len = [], 0
+            await storage.run(sink.write, data)
+
+    async def run(self):
+        sink = gzip.GzipFile(fileobj=self.buffer, mode="wb") if self.compress else self.buffer
+        try:
+            self._write(self._header())
+            async for msg in self.channel.history(limit=None, oldest_first=True):
+                self._write(self._render(msg))
+                self.count += 1
+                if self._pending_len >= TRANSCRIPT_CHUNK_BYTES:
+                    await self._flush(sink)
+                    if self.buffer.tell() >= TRANSCRIPT_MAX_BYTES:
+                        self.truncated = True
+                        break
+            self._write(self._footer())
+            await self._flush(sink)
+        finally:
+            if sink is not self.buffer:
+                await storage.run(sink.close)
+        if self._inline_parts is not None:
+            self.inline = "".join(self._inline_parts)
+        self._inline_parts = None
+        self.buffer.seek(0)
+
+    def close(self):
+        self.buffer.close()
+
+    def file(self) -> discord.File:
+        name = f"{self.channel.name}.{self.fmt}" + (".gz" if self.compress else "")
+        return discord.File(self.buffer, filename=name)
+
+    def _header(self) -> str:
+        if self.fmt == "html":
+            title = html.escape(self.channel.name)
+            return (
+                f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title></head>"
+                f"<body><h1>Transcript for {title}</h1>\n"
+            )
+        if self.fmt == "jsonl":
+            return ""
+        return f"📝 **Transcript for {self.channel.name}**\n\n"
+
+    def _footer(self) -> str:
+        note = f"Transcript cut off after {self.count} messages." if self.truncated else ""
+        if self.fmt == "html":
+            return (f"<p><i>{note}</i></p>\n" if note else "") + "</body></html>\n"
+        if self.fmt == "jsonl":
+            return json.dumps({"truncated": True, "messages": self.count}) + "\n" if note else ""
+        return f"\n⚠️ {note}\n" if note else ""
+
+    def _render(self, msg) -> str:
+        attachments = [
+            {"filename": a.filename, "url": a.url, "size": a.size, "content_type": a.content_type}
+            for a in msg.attachments
+        ]
+        embeds = [{"title": e.title, "description": e.description, "url": e.url} for e in msg.embeds]
+
+        if self.fmt == "jsonl":
+            return json.dumps({
+                "id": msg.id,
+                "created_at": msg.created_at.isoformat(),
+                "author_id": msg.author.id,
+                "author": str(msg.author),
+                "content": msg.content,
+                "attachments": attachments,
+                "embeds": embeds
+            }, ensure_ascii=False) + "\n"
+
+        timestamp = msg.created_at.strftime('%Y-%m-%d %H:%M')
+        if self.fmt == "html":
+            parts = [
+                f"<div><small>[{timestamp}]</small> <b>{html.escape(str(msg.author))}</b>: "
+                f"{html.escape(msg.content)}"
+            ]
+            for a in attachments:
+                parts.append(f"<br>📎 <a href=\"{html.escape(a['url'])}\">{html.escape(a['filename'])}</a> ({a['size']} bytes)")
+            for e in embeds:
+                parts.append(f"<br>🧩 {html.escape(e['title'] or 'embed')}")
+            parts.append("</div>\n")
+            return "".join(parts)
+
+        lines = [f"[{timestamp}] {msg.author}: {msg.content}\n"]
+        for a in attachments:
+            lines.append(f"    📎 {a['filename']} ({a['size']} bytes) {a['url']}\n")
+        for e in embeds:
+            lines.append(f"    🧩 {e['title'] or 'embed'}\n")
+        return "".join(lines)
+
+
+async def post_transcript(channel, log_channel, note: str = ""):
+    """Post channel's history to log_channel along with its receipt, if it has one."""
+    transcript = TranscriptExport(channel, TRANSCRIPT_FORMAT, TRANSCRIPT_GZIP)
+    try:
+        await transcript.run()
+        if transcript.inline is not None:
+            await outbound.send(
+                log_channel,
+                content=f"📄 Log for {channel.name}{note}:\n{transcript.inline}",
+                embed=ticket_receipts.get(channel.id),
+                priority=PRIORITY_BULK
+            )
+        else:
+            await outbound.send(
+                log_channel,
+                content=f"📁 Log for {channel.name}{note} ({transcript.count} messages):",
+                embed=ticket_receipts.get(channel.id),
+                file=transcript.file(),
+                priority=PRIORITY_BULK
+            )
+    finally:
+        transcript.close()
 
 
 class CloseTicketView(discord.ui.View):
@@ -534,133 +4042,147 @@ class CloseTicketView(discord.ui.View):
         self.ticket_channel_id = ticket_channel_id
         self.add_item(CloseTicketButton(ticket_channel_id))
 
-class CloseTicketButton(discord.ui.Button):
+class CloseTicketButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:close:(?P<channel_id>\d+)"):
     def __init__(self, ticket_channel_id: int):
-        super().__init__(label="🔒 Close Ticket", style=discord.ButtonStyle.danger)
+        super().__init__(discord.ui.Button(
+            label="🔒 Close Ticket", style=discord.ButtonStyle.danger, custom_id=f"shop:close:{ticket_channel_id}"
+        ))
         self.ticket_channel_id = ticket_channel_id
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["channel_id"]))
+
     async def callback(self, interaction: discord.Interaction):
         log_channel = discord.utils.get(interaction.guild.text_channels, name="ticket-logs")
         if not log_channel:
             await interaction.response.send_message("⚠️ No 'ticket-logs' channel found.", ephemeral=True)
             return
 
-        # Get all messages in the ticket channel
+        await interaction.response.defer(ephemeral=True, thinking=True)
         ticket_channel = interaction.channel
-        messages = [msg async for msg in ticket_channel.history(limit=None, oldest_first=True)]
-        
-        # Build a log of the chat
-        log_text = f"📝 **Transcript for {ticket_channel.name}**\n\n"
-        for msg in messages:
-            timestamp = msg.created_at.strftime('%Y-%m-%d %H:%M')
-            log_text += f"[{timestamp}] {msg.author}: {msg.content}\n"
-
-        # If the log is too long, send it as a file
-        if len(log_text) > 1900:
-            with open("ticket_log.txt", "w", encoding="utf-8") as f:
-                f.write(log_text)
-            await log_channel.send(
-                content=f"📁 Log for {ticket_channel.name}:",
-                embed=ticket_receipts.get(ticket_channel.id),
-                file=discord.File("ticket_log.txt")
-            )
-            os.remove("ticket_log.txt")
-        else:
-            await log_channel.send(
-                content=f"📄 Log for {ticket_channel.name}:\n{log_text}",
-                embed=ticket_receipts.get(ticket_channel.id)
-            )
+        await post_transcript(ticket_channel, log_channel)
 
-        await interaction.response.send_message("✅ Ticket will be closed.", ephemeral=True)
-        await ticket_channel.delete()
+        await outbound.followup(interaction, "✅ Ticket will be closed.", ephemeral=True)
+        ticket_receipts.pop(ticket_channel.id, None)
+        await storage.run(session_store.drop_receipt, ticket_channel.id)
+        await storage.run(order_ledger.close, ticket_channel.id)
+        await ticket_channels.close(ticket_channel)
 
 
 
-class ConfirmOrderButton(discord.ui.Button):
+class ConfirmOrderButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:confirm:(?P<user_id>\d+)"):
     def __init__(self, user_id: int):
-        super().__init__(label="✅ Confirm Order", style=discord.ButtonStyle.success)
+        super().__init__(discord.ui.Button(
+            label="✅ Confirm Order", style=discord.ButtonStyle.success, custom_id=f"shop:confirm:{user_id}"
+        ))
         self.user_id = user_id
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(int(match["user_id"]))
+
     async def callback(self, interaction: discord.Interaction):
-        cart = user_carts.get(self.user_id)
-        if not cart or not cart.get('items') or not cart.get('server'):
+        key = session_key(interaction, self.user_id)
+        cart = user_carts.get(key)
+        if not cart or not cart.server:
             await interaction.response.send_message("🛒 Nothing to confirm.", ephemeral=True)
             return
 
-        items = cart['items']
-        server = cart['server']
-        inventory = load_inventory(server)
-        counts = Counter((item['name'], item['category']) for item in items)
-        lines = []
-        total = 0.0
+        # Empty the cart before the first await, so a second click (or a second
+        # confirm racing this one) finds nothing to order. Everything below works
+        # on this snapshot, and it goes back into the cart if the order fails.
+        order = cart.take()
+        placed = False
+        try:
+            placed = await self.place(interaction, key, order)
+        finally:
+            if not placed:
+                cart.put_back(order)
+
+    async def place(self, interaction: discord.Interaction, key: tuple, order: Cart) -> bool:
+        server = order.server
+        missing = order.reprice(await storage.load(server))
+        if missing:
+            await interaction.response.send_message(
+                f"⚠️ Item `{missing[0].name}` in category `{missing[0].category}` no longer exists in the inventory.",
+                ephemeral=True
+            )
+            return False
 
-        for (name, category), cnt in counts.items():
-            if category in inventory and name in inventory[category]:
-                price = float(inventory[category][name]['price'])
-                total += price * cnt
-                lines.append(f"{cnt}x {name} @ ${price:.2f}")
-            else:
-                await interaction.response.send_message(
-                    f"⚠️ Item `{name}` in category `{category}` no longer exists in the inventory.",
-                    ephemeral=True
-                )
-                return
+        total = order.total
+        lines = [f"{line.quantity}x {line.name} @ ${line.unit_price:.2f}" for line in order]
 
         if total < 5.0:
             await interaction.response.send_message(
                 f"⚠️ The minimum order is $5.00. Your cart total is ${total:.2f}.",
                 ephemeral=True
             )
-            return
+            return False
 
         member = interaction.guild.get_member(self.user_id)
         ticket_name = f"{server}-ticket-{member.name}".lower().replace(" ", "-")
 
-        ticket_ch = await interaction.guild.create_text_channel(
-            ticket_name,
-            overwrites={
-                interaction.guild.default_role: discord.PermissionOverwrite(view_channel=False),
-                member: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-                interaction.guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True)
-            },
-            topic=f"Order ticket for {member.name} on {server}"
-        )
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        quantities = order.quantities()
+        problem = await reservations.commit(server, key, quantities)
+        if problem:
+            await outbound.followup(interaction, problem, ephemeral=True)
+            return False
+
+        # The shop channel becomes the ticket, so the shopping history stays in the transcript.
+        shop_channel = interaction.guild.get_channel_or_thread(user_tickets.get(key, 0))
+        try:
+            ticket_ch = await ticket_channels.to_ticket(
+                shop_channel, interaction.guild, member, ticket_name, f"Order ticket for {member.name} on {server}"
+            )
+        except Exception:
+            await reservations.restock(server, quantities)
+            raise
 
+        order_id = await storage.run(
+            order_ledger.record, key, server,
+            [(line.category, line.name, line.quantity, line.unit_price) for line in order], ticket_ch.id
+        )
         receipt_text = "\n".join(lines) + f"\n\n💰 **Total: ${total:.2f}**"
         embed = discord.Embed(
-            title="🧾 Order Receipt",
+            title=f"🧾 Order Receipt #{order_id}",
             description=f"**User:** {member.mention}\n**Server:** {server.title()}\n\n{receipt_text}",
             color=discord.Color.green()
         )
 
-        await ticket_ch.send(
+        await outbound.send(
+            ticket_ch,
             f"New order from {member.mention}:",
             embed=embed,
-            view=CloseTicketView(ticket_ch.id)
+            view=CloseTicketView(ticket_ch.id),
+            priority=PRIORITY_INTERACTION
         )
 
         ticket_receipts[ticket_ch.id] = embed
-        user_carts[self.user_id]['items'] = []
+        cart = user_carts.get(key)
+        if not cart:
+            await reservations.release(key)
+        user_tickets.pop(key, None)
+        await storage.run(session_store.save_receipt, ticket_ch.id, embed)
+        await storage.run(session_store.save_cart, key, cart or ())
+        await storage.run(session_store.forget_channel, key)
 
-        try:
-            user_channel = interaction.channel
-            await interaction.response.send_message(
-                f"✅ Ticket created: {ticket_ch.mention}\n🗑️ Closing your shop chat...",
-                ephemeral=True
-            )
-            await user_channel.delete()
-        except Exception as e:
-            await ticket_ch.send(f"⚠️ Failed to delete the shop channel: {e}")
+        await outbound.followup(interaction, f"✅ Order placed, your ticket is {ticket_ch.mention}", ephemeral=True)
+        return True
 
 
 @bot.tree.command(name="shop", description="Start browsing the shop")
+@instrumented
 async def shop_cmd(interaction: discord.Interaction):
     user_id = interaction.user.id
-    existing_channel_id = user_tickets.get(user_id)
+    key = session_key(interaction)
+    existing_channel_id = user_tickets.get(key)
     current_channel = interaction.channel
 
     if existing_channel_id:
-        existing_channel = interaction.guild.get_channel(existing_channel_id)
+        existing_channel = interaction.guild.get_channel_or_thread(existing_channel_id)
         if existing_channel:
             if current_channel.id == existing_channel.id:
                 # They're already in their shop channel, show Home UI
@@ -673,7 +4195,8 @@ async def shop_cmd(interaction: discord.Interaction):
                 )
             return
         else:
-            user_tickets.pop(user_id, None)
+            user_tickets.pop(key, None)
+            await storage.run(session_store.forget_channel, key)
 
     # No existing ticket — show server select view
     await interaction.response.send_message(
@@ -681,22 +4204,214 @@ async def shop_cmd(interaction: discord.Interaction):
     )
 
 
+@bot.listen("on_interaction")
+async def touch_session(interaction: discord.Interaction):
+    # Any click or command counts as activity for the shopper's cart and shop channel.
+    key = session_key(interaction)
+    user_carts.touch(key)
+    user_tickets.touch(key)
+
+
+async def expire_cart(key: tuple):
+    """Release an idle cart's holds. Shoppers with an open shop channel keep an
+    empty cart (it remembers the server); everyone else loses the session."""
+    if shard_of(key[0]) not in bot.shards:
+        user_carts.pop(key, None)  # another process serves that guild; only forget our copy
+        return
+    await reservations.release(key)
+    if key in user_tickets:
+        cart = user_carts.get(key)
+        if cart:
+            cart.clear()
+            await storage.run(session_store.save_cart, key, cart)
+        user_carts.touch(key)
+        return
+    user_carts.pop(key, None)
+    await storage.run(session_store.drop_session, key)
+
+
+async def close_abandoned(key: tuple, channel_id: int) -> bool:
+    guild = bot.get_guild(key[0])
+    if guild is None and shard_of(key[0]) not in bot.shards:
+        user_tickets.pop(key, None)  # another process serves that guild; only forget our copy
+        user_carts.pop(key, None)
+        return False
+    channel = guild.get_channel_or_thread(channel_id) if guild else None
+    last_message = getattr(channel, "last_message_id", None)
+    if last_message and discord.utils.snowflake_time(last_message).timestamp() > time.time() - SHOP_CHANNEL_IDLE_TTL:
+        user_tickets.touch(key)  # still being talked in, just not clicked
+        return False
+
+    user_tickets.pop(key, None)
+    user_carts.pop(key, None)
+    await reservations.release(key)
+    await storage.run(session_store.drop_session, key)
+    if channel is None:
+        return True
+    log_channel = discord.utils.get(guild.text_channels, name="ticket-logs")
+    if log_channel:
+        await post_transcript(channel, log_channel, " (abandoned)")
+    await ticket_channels.close(channel, PRIORITY_BULK)
+    return True
+
+
+async def reap_sessions():
+    carts = user_carts.idle(CART_IDLE_TTL, SESSION_MAX)
+    for key in carts:
+        await expire_cart(key)
+
+    # At most REAPER_BATCH channels per sweep, so closing them never crowds out live traffic.
+    idle = [(key, user_tickets[key]) for key in user_tickets.idle(SHOP_CHANNEL_IDLE_TTL, SESSION_MAX)]
+    results = await asyncio.gather(
+        *(close_abandoned(key, channel_id) for key, channel_id in idle[:REAPER_BATCH]), return_exceptions=True
+    )
+    closed = sum(1 for r in results if r is True)
+    for r in results:
+        if isinstance(r, Exception):
+            print(f"⚠️ Failed to close an abandoned shop channel: {r}")
+
+    await reservations.prune()
+    metrics.inc("shop_reaped_total", len(carts), kind="cart")
+    metrics.inc("shop_reaped_total", closed, kind="channel")
+    if carts or closed:
+        print(f"🧹 Expired {len(carts)} idle carts, closed {closed} abandoned shop channels")
+
+
+async def follow_changes():
+    """Apply what other processes sharing the state backend have changed."""
+    while True:
+        await asyncio.sleep(STATE_POLL_INTERVAL)
+        try:
+            for topic, key in dict.fromkeys(await storage.run(shared_state.poll)):
+                await apply_change(topic, key)
+        except Exception as e:
+            print(f"⚠️ Failed to apply shared state changes: {e}")
+
+
+async def apply_change(topic: str, key: str):
+    if topic == "inventory":
+        invalidate_inventory(key)
+        inventory_events.emit("changed", key)
+    elif topic == "servers":
+        await server_registry.reload()
+        for server in [s for s in list(_inventory_cache) if s not in SERVER_FILES]:
+            evict_inventory(server)
+        await refresh_lobbies()
+    elif topic == "receipt":
+        embed = await storage.run(session_store.load_receipt, int(key))
+        if embed is None:
+            ticket_receipts.pop(int(key), None)
+        else:
+            ticket_receipts[int(key)] = embed
+    elif topic == "session":
+        session = tuple(map(int, key.split(":")))
+        if bot.is_ready() and shard_of(session[0]) not in bot.shards:
+            return  # served by another process
+        cart, channel_id = await storage.run(session_store.load_session, session)
+        if cart is None:
+            user_carts.pop(session, None)
+        else:
+            user_carts[session] = cart
+        if channel_id:
+            user_tickets[session] = channel_id
+        else:
+            user_tickets.pop(session, None)
+
+
+async def session_reaper():
+    await bot.wait_until_ready()
+    while True:
+        try:
+            await reap_sessions()
+        except Exception as e:
+            print(f"⚠️ Session reaper failed: {e}")
+        await asyncio.sleep(REAPER_INTERVAL)
+
+
+# Autocomplete answers straight from search_index, so a keystroke never waits on storage.
+@instrumented
+async def server_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    return [
+        app_commands.Choice(name=server_registry.label(server), value=server)
+        for server in SERVER_FILES if current in server or current in server_registry.label(server).lower()
+    ][:25]
+
+
+async def _ensure_loaded(server: str):
+    # The first lookup against a server that isn't loaded yet pays for loading it.
+    if server in SERVER_FILES and not search_index.loaded(server):
+        await storage.load(server)
+
+
+@instrumented
+async def category_autocomplete(interaction: discord.Interaction, current: str):
+    server = (interaction.namespace.server or "").lower()
+    await _ensure_loaded(server)
+    return [
+        app_commands.Choice(name=category, value=category)
+        for category in search_index.categories(server, current) if len(category) <= 100
+    ]
+
+
+@instrumented
+async def item_autocomplete(interaction: discord.Interaction, current: str):
+    server = (interaction.namespace.server or "").lower() or None
+    category = interaction.namespace.category or None
+    # Without a server every registered one is searched, so load whichever are not (off the loop).
+    await asyncio.gather(*(_ensure_loaded(srv) for srv in ([server] if server else server_registry.names())))
+    return [
+        app_commands.Choice(name=f"{item} · {cat} ({srv})"[:100], value=item)
+        for srv, cat, item in search_index.items(current, server, category) if len(item) <= 100
+    ]
+
+
+@bot.tree.command(name="search", description="Search the shop for an item")
+@app_commands.describe(query="Item name, or part of it", server="Only search this server",
+                       category="Only search this category")
+@app_commands.autocomplete(query=item_autocomplete, server=server_autocomplete, category=category_autocomplete)
+@instrumented
+async def search_cmd(interaction: discord.Interaction, query: str, server: str = None, category: str = None):
+    server = server.lower() if server else None
+    if server and server not in SERVER_FILES:
+        await interaction.response.send_message("❌ Invalid server name.", ephemeral=True)
+        return
+
+    servers = [server] if server else server_registry.names()
+    if not all(search_index.loaded(srv) for srv in servers):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        for srv in servers:
+            await _ensure_loaded(srv)
+    reply = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+
+    matches = search_index.items(query, server, category, limit=CATALOG_PAGE_SIZE)
+    embeds, files = [], []
+    for srv, cat, item in matches:
+        info = (await storage.load(srv)).get(cat, {}).get(item)
+        if info:
+            embed = item_embed(item, info, files, srv, cat).copy()
+            embed.set_footer(text=f"{srv} › {cat}")
+            embeds.append(embed)
+
+    if not embeds:
+        await reply(f"🔍 No items match **{query}**.", ephemeral=True)
+        return
+    await reply(
+        f"🔍 {len(embeds)} result(s) for **{query}** — open the shop with /shop to buy.",
+        embeds=embeds, files=files, ephemeral=True
+    )
 
-class EditItemCategorySelect(discord.ui.Select):
-    def __init__(self, user_id: int, server: str):
-        self.user_id = user_id
-        self.server = server
-        inventory = load_inventory(server)
-        options = [discord.SelectOption(label=cat, value=cat) for cat in inventory.keys()]
-        super().__init__(placeholder="Select a category", options=options)
 
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Unauthorized", ephemeral=True)
-            return
 
-        category = self.values[0]
-        inventory = load_inventory(self.server)
+class EditItemCategorySelectView(ItemPicker):
+    placeholder = "Select a category"
+
+    def __init__(self, user_id: int, server: str, categories: list):
+        self.server = server
+        super().__init__(user_id, categories)
+
+    async def picked(self, interaction: discord.Interaction, category: str):
+        inventory = await storage.load(self.server)
         items = list(inventory.get(category, {}).keys())
 
         if not items:
@@ -710,44 +4425,29 @@ class EditItemCategorySelect(discord.ui.Select):
         )
 
 
-class EditItemCategorySelectView(discord.ui.View):
-    def __init__(self, user_id: int, server: str):
-        super().__init__(timeout=None)
-        self.add_item(EditItemCategorySelect(user_id, server))
-
+class EditItemNameSelectView(ItemPicker):
+    placeholder = "Select item to edit"
 
-class EditItemNameSelect(discord.ui.Select):
     def __init__(self, user_id: int, server: str, category: str, items: list):
-        self.user_id = user_id
         self.server = server
         self.category = category
-        options = [discord.SelectOption(label=item, value=item) for item in items]
-        super().__init__(placeholder="Select item to edit", options=options)
+        super().__init__(user_id, items)
 
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Unauthorized", ephemeral=True)
+    async def picked(self, interaction: discord.Interaction, item_name: str):
+        item = (await storage.load(self.server)).get(self.category, {}).get(item_name)
+        if not item:
+            await interaction.response.send_message("⚠️ That item no longer exists.", ephemeral=True)
             return
-
-        item_name = self.values[0]
-        await interaction.response.send_modal(EditItemModal(self.server, self.category, item_name))
-
-
-class EditItemNameSelectView(discord.ui.View):
-    def __init__(self, user_id: int, server: str, category: str, items: list):
-        super().__init__(timeout=None)
-        self.add_item(EditItemNameSelect(user_id, server, category, items))
+        await interaction.response.send_modal(EditItemModal(self.server, self.category, item_name, item))
 
 
 class EditItemModal(discord.ui.Modal, title="Edit Item"):
-    def __init__(self, server: str, category: str, item_name: str):
+    def __init__(self, server: str, category: str, item_name: str, item: Mapping):
         super().__init__()
         self.server = server
         self.category = category
         self.item_name = item_name
-
-        inventory = load_inventory(server)
-        item = inventory[category][item_name]
+        self.item = item
 
         self.new_name = discord.ui.TextInput(label="Item Name", default=item_name)
         self.price = discord.ui.TextInput(label="Price", default=str(item['price']))
@@ -767,68 +4467,454 @@ class EditItemModal(discord.ui.Modal, title="Edit Item"):
             await interaction.response.send_message("❌ Invalid price or stock.", ephemeral=True)
             return
 
-        inventory = load_inventory(self.server)
-
-        # Delete old item name if changed
-        if self.item_name != self.new_name.value.strip():
-            del inventory[self.category][self.item_name]
-
-        inventory[self.category][self.new_name.value.strip()] = {
-            "price": new_price,
-            "stock": new_stock,
-            "image": self.image.value.strip()
-        }
-
-        save_inventory(self.server, inventory)
+        new_name, image = self.new_name.value.strip(), self.image.value.strip()
+        if new_name == self.item_name and image == self.item.get('image', ''):
+            # Only write the numbers that changed, so stock sold since the modal
+            # opened isn't put back by a price edit.
+            updated = True
+            if new_price != self.item['price']:
+                updated = await storage.set_price(self.server, self.category, self.item_name, new_price)
+            if updated and new_stock != self.item['stock']:
+                updated = await storage.set_stock(self.server, self.category, self.item_name, new_stock)
+        else:
+            updated = await storage.update_item(
+                self.server, self.category, self.item_name, new_name, new_price, new_stock, image
+            )
+        if not updated:
+            await interaction.response.send_message("⚠️ That item no longer exists.", ephemeral=True)
+            return
+        image_cache.schedule(image)
 
         await interaction.response.send_message(
-            f"✅ **{self.new_name.value.strip()}** has been updated.", ephemeral=True
+            f"✅ **{new_name}** has been updated.", ephemeral=True
         )
 
 
 @bot.tree.command(name="edititem", description="Edit an existing item")
 @app_commands.checks.has_permissions(administrator=True)
 @app_commands.describe(server="Server to edit item in")
+@app_commands.autocomplete(server=server_autocomplete)
+@instrumented
 async def edititem(interaction: discord.Interaction, server: str):
     if server.lower() not in SERVER_FILES:
         await interaction.response.send_message("❌ Invalid server name.", ephemeral=True)
         return
 
+    inventory = await storage.load(server)
     await interaction.response.send_message(
         "📂 Select a category:",
-        view=EditItemCategorySelectView(interaction.user.id, server.lower()),
+        view=EditItemCategorySelectView(interaction.user.id, server.lower(), list(inventory.keys())),
         ephemeral=True
     )
 
-# Add load_inventory and save_inventory if not already present:
-def load_inventory(server: str) -> dict:
-    filename = SERVER_FILES.get(server.lower())
-    if not filename:
-        return {}
-    if not os.path.isfile(filename):
-        with open(filename, 'w') as f:
-            json.dump({}, f, indent=4)
-    with open(filename, 'r') as f:
-        return json.load(f)
 
-def save_inventory(server: str, data: dict):
-    filename = SERVER_FILES.get(server.lower())
-    if not filename:
+CATALOG_FIELDS = ("category", "item", "price", "stock", "image")
+CATALOG_MAX_BYTES = 4 * 1024 * 1024
+CATALOG_MAX_ERRORS = 15
+
+
+def catalog_rows(inventory: Mapping):
+    for category, items in inventory.items():
+        for item, info in items.items():
+            yield category, item, info.get("price", 0), info.get("stock", 0), info.get("image", "") or ""
+
+
+def export_catalog(inventory: Mapping, fmt: str) -> bytes:
+    if fmt == "json":
+        return json.dumps(thaw(inventory), indent=4).encode()
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CATALOG_FIELDS)
+    writer.writerows(catalog_rows(inventory))
+    return out.getvalue().encode()
+
+
+def _catalog_records(data: bytes, fmt: str):
+    """Yield (line, category, item, price, stock, image) without building the whole table first."""
+    if fmt == "json":
+        parsed = json.loads(data.decode("utf-8-sig"))
+        if not isinstance(parsed, dict):
+            raise ValueError("JSON catalog must map categories to items.")
+        for category, items in parsed.items():
+            if not isinstance(items, dict):
+                raise ValueError(f"Category '{category}' must map item names to details.")
+            for item, info in items.items():
+                info = info if isinstance(info, dict) else {}
+                yield f"{category}/{item}", category, item, info.get("price"), info.get("stock"), info.get("image")
+        return
+
+    reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline=""))
+    missing = {"category", "item", "price", "stock"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}.")
+    for row in reader:
+        yield f"line {reader.line_num}", row["category"], row["item"], row["price"], row["stock"], row.get("image")
+
+
+def parse_catalog(data: bytes, fmt: str):
+    """Validate an uploaded catalog. Returns ({(category, item): info}, [errors])."""
+    rows, errors = {}, []
+    try:
+        for where, category, item, price, stock, image in _catalog_records(data, fmt):
+            category, item = str(category or ""), str(item or "")
+            try:
+                if not category.strip() or not item.strip():
+                    raise ValueError("category and item are required")
+                if len(item) > 100 or len(category) > 100:
+                    raise ValueError("names are limited to 100 characters")
+                price, stock = float(price), int(stock)
+                if price < 0 or stock < 0:
+                    raise ValueError("price and stock can't be negative")
+                if (category, item) in rows:
+                    raise ValueError(f"duplicate of {category}/{item}")
+            except (TypeError, ValueError) as e:
+                errors.append(f"{where}: {e}")
+                if len(errors) >= CATALOG_MAX_ERRORS:
+                    break
+                continue
+            rows[(category, item)] = {"price": price, "stock": stock, "image": str(image or "").strip()}
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        errors.append(str(e))
+    return rows, errors
+
+
+def merge_catalog(current: Mapping, rows: dict, replace: bool):
+    """Apply validated rows to a copy of the inventory. Returns (inventory, adds, updates, removals)."""
+    merged = {} if replace else thaw(current)
+    adds, updates = [], []
+    for (category, item), info in rows.items():
+        old = current.get(category, {}).get(item)
+        new = dict(old) if old else {}
+        new.update(price=info["price"], stock=info["stock"])
+        if info["image"] or not old:
+            new["image"] = info["image"]
+        merged.setdefault(category, {})[item] = new
+        if old is None:
+            adds.append(f"{category}/{item}")
+        elif any(new.get(k) != old.get(k) for k in ("price", "stock", "image")):
+            updates.append(f"{category}/{item}")
+    removals = []
+    if replace:
+        removals = [f"{category}/{item}" for category, items in current.items()
+                    for item in items if (category, item) not in rows]
+    return merged, adds, updates, removals
+
+
+def apply_catalog(server: str, rows: dict, replace: bool):
+    """Merge rows into the inventory as it is now and save it. Returns (adds, updates, removals)."""
+    merged, adds, updates, removals = merge_catalog(load_inventory(server), rows, replace)
+    save_inventory(server, merged)
+    return adds, updates, removals
+
+
+def catalog_diff_embed(server: str, adds: list, updates: list, removals: list, title: str) -> discord.Embed:
+    embed = discord.Embed(title=title, description=f"Server: **{server.title()}**", color=discord.Color.orange())
+    for label, names in (("➕ Added", adds), ("✏️ Updated", updates), ("🗑️ Removed", removals)):
+        preview = "\n".join(names[:10]) + (f"\n…and {len(names) - 10} more" if len(names) > 10 else "")
+        embed.add_field(name=f"{label}: {len(names)}", value=preview[:1024] or "—", inline=False)
+    return embed
+
+
+class ImportCatalogView(discord.ui.View):
+    def __init__(self, user_id: int, server: str, rows: dict, replace: bool):
+        super().__init__(timeout=600)
+        self.user_id = user_id
+        self.server = server
+        self.rows = rows
+        self.replace = replace
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You cannot interact with this menu.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Apply", style=discord.ButtonStyle.success)
+    async def apply(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Merge against the inventory as it is now, in case it moved since the dry run. The save
+        # rewrites every item, so no checkout may change stock between that read and the write.
+        current = await storage.load(self.server)
+        items = set(self.rows).union((category, item) for category, names in current.items() for item in names)
+        adds, updates, removals = await reservations.exclusive(
+            self.server, items, apply_catalog, self.server, self.rows, self.replace
+        )
+        for info in self.rows.values():
+            image_cache.schedule(info["image"])
+        self.stop()
+        await interaction.response.edit_message(
+            content="✅ Catalog imported.",
+            embed=catalog_diff_embed(self.server, adds, updates, removals, "📦 Import applied"),
+            view=None
+        )
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        await interaction.response.edit_message(content="❌ Import cancelled.", embed=None, view=None)
+
+
+@bot.tree.command(name="importcatalog", description="Bulk add or update items from a CSV or JSON file")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(server="Server to import into", file="CSV (category,item,price,stock,image) or JSON",
+                       replace="Remove items that are not in the file")
+@app_commands.autocomplete(server=server_autocomplete)
+@instrumented
+async def importcatalog(interaction: discord.Interaction, server: str, file: discord.Attachment, replace: bool = False):
+    server = server.lower()
+    if server not in SERVER_FILES:
+        await interaction.response.send_message("❌ Invalid server name.", ephemeral=True)
+        return
+    fmt = "json" if file.filename.lower().endswith(".json") else "csv"
+    if file.size > CATALOG_MAX_BYTES:
+        await interaction.response.send_message("❌ That file is too large.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    rows, errors = await storage.run(parse_catalog, await file.read(), fmt)
+    if errors:
+        await outbound.followup(
+            interaction, "❌ The file has problems, nothing was imported:\n" + "\n".join(errors)[:1900],
+            ephemeral=True
+        )
+        return
+
+    current = await storage.load(server)
+    _, adds, updates, removals = merge_catalog(current, rows, replace)
+    await outbound.followup(
+        interaction, "🔎 Dry run — review the changes, then apply them.",
+        embed=catalog_diff_embed(server, adds, updates, removals, "📦 Import preview"),
+        view=ImportCatalogView(interaction.user.id, server, rows, replace),
+        ephemeral=True
+    )
+
+
+@bot.tree.command(name="exportcatalog", description="Download a server's catalog as CSV or JSON")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(server="Server to export", fmt="File format")
+@app_commands.rename(fmt="format")
+@app_commands.autocomplete(server=server_autocomplete)
+@instrumented
+async def exportcatalog(interaction: discord.Interaction, server: str, fmt: Literal["csv", "json"] = "csv"):
+    server = server.lower()
+    if server not in SERVER_FILES:
+        await interaction.response.send_message("❌ Invalid server name.", ephemeral=True)
+        return
+    data = export_catalog(await storage.load(server), fmt)
+    await interaction.response.send_message(
+        f"📤 Catalog for **{server.title()}**:",
+        file=discord.File(io.BytesIO(data), filename=f"{server}_catalog.{fmt}"),
+        ephemeral=True
+    )
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+
+def stats_embed() -> discord.Embed:
+    embed = discord.Embed(title="📈 Shop stats", color=discord.Color.teal())
+    uptime = int(time.time() - metrics.started)
+    embed.description = f"Up {uptime // 3600}h {uptime % 3600 // 60}m"
+
+    handlers = metrics.by_label("shop_handler_seconds", "handler", histograms=True)
+    errors = metrics.by_label("shop_handler_errors_total", "handler")
+    slowest = sorted(handlers.items(), key=lambda kv: kv[1].quantile(0.95), reverse=True)[:8]
+    embed.add_field(name="⏱️ Slowest handlers (p95)", inline=False, value="\n".join(
+        f"`{name}` {h.count}× avg {_ms(h.total / h.count)} p95 {_ms(h.quantile(0.95))}"
+        + (f" ⚠️ {int(errors[name])} errors" if errors.get(name) else "")
+        for name, h in slowest
+    )[:1024] or "—")
+
+    routes = metrics.by_label("shop_api_calls_total", "route")
+    top_routes = sorted(routes.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    embed.add_field(name="🌐 Discord API", inline=False, value=(
+        f"{int(sum(routes.values()))} calls, {int(metrics.counter('shop_api_ratelimited_total'))} × 429, "
+        f"{int(metrics.counter('shop_api_errors_total'))} errors\n"
+        + "\n".join(f"`{route}` {int(n)}" for route, n in top_routes)
+    )[:1024])
+
+    hits = metrics.counter("shop_inventory_cache_total", result="hit")
+    misses = metrics.counter("shop_inventory_cache_total", result="miss")
+    loads = metrics.by_label("shop_inventory_load_seconds", "server", histograms=True).values()
+    writes = metrics.by_label("shop_inventory_write_seconds", "op", histograms=True).values()
+    load_count, load_total = sum(h.count for h in loads), sum(h.total for h in loads)
+    write_count, write_total = sum(h.count for h in writes), sum(h.total for h in writes)
+    embed.add_field(name="💾 Inventory", inline=False, value=(
+        f"Cache hit rate {hits / max(hits + misses, 1):.0%} ({int(hits)}/{int(hits + misses)})\n"
+        f"{load_count} loads, avg {_ms(load_total / max(load_count, 1))}, "
+        f"{metrics.counter('shop_inventory_load_bytes_total') / 1024:.0f} KB read\n"
+        f"{write_count} writes, avg {_ms(write_total / max(write_count, 1))}, "
+        f"{metrics.counter('shop_disk_bytes_written_total') / 1024:.0f} KB written"
+    ))
+
+    embed.add_field(name="🛒 Live", inline=False, value="\n".join(
+        f"{name.removeprefix('shop_').replace('_', ' ')}: {value}" for name, value in sorted(metrics.read_gauges().items())
+    ) or "—")
+
+    per_shard = metrics.read_gauges(labelled=True)
+    shard_handlers = metrics.by_label("shop_handler_seconds", "shard", histograms=True)
+    latency, guilds = per_shard.get("shop_gateway_latency_seconds", {}), per_shard.get("shop_shard_guilds", {})
+    queued = per_shard.get("shop_outbound_queue_depth", {})
+    embed.add_field(name=f"🧩 Shards ({bot.shard_count or 1})", inline=False, value="\n".join(
+        f"`{shard}` {guilds.get(shard, 0)} guilds, "
+        f"{_ms(latency[shard]) if math.isfinite(latency.get(shard, math.inf)) else '—'} gateway, "
+        f"{queued.get(shard, 0)} queued"
+        + (f", p95 {_ms(shard_handlers[shard].quantile(0.95))}" if shard in shard_handlers else "")
+        for shard in sorted(set(guilds) | set(queued) | set(latency), key=int)
+    )[:1024] or "—")
+    return embed
+
+
+@bot.tree.command(name="stats", description="Show the bot's performance counters")
+@app_commands.checks.has_permissions(administrator=True)
+@instrumented
+async def stats_cmd(interaction: discord.Interaction):
+    await interaction.response.send_message(embed=stats_embed(), ephemeral=True)
+
+
+def _when(ts: float) -> str:
+    return discord.utils.format_dt(datetime.datetime.fromtimestamp(ts, datetime.timezone.utc), "R")
+
+
+@bot.tree.command(name="orders", description="Show recent orders")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(user="Only this customer's orders", limit="How many orders to show (max 25)")
+@instrumented
+async def orders_cmd(interaction: discord.Interaction, user: discord.Member = None,
+                     limit: app_commands.Range[int, 1, 25] = 10):
+    rows = await storage.run(order_ledger.orders, interaction.guild_id, user.id if user else None, limit)
+    if not rows:
+        await interaction.response.send_message("📭 No orders yet.", ephemeral=True)
+        return
+    lines = await storage.run(order_ledger.lines, [row[0] for row in rows])
+
+    title = f"🧾 Recent orders by {user.display_name}" if user else "🧾 Recent orders"
+    embed = discord.Embed(title=title, color=discord.Color.green())
+    for order_id, user_id, server, units, total, ticket_id, created_at, closed_at in rows:
+        items = ", ".join(f"{qty}x {item}" for _, item, qty, _ in lines[order_id])
+        status = f"closed {_when(closed_at)}" if closed_at else f"open in <#{ticket_id}>"
+        embed.add_field(
+            name=f"#{order_id} · ${total:.2f} · {server.title()}", inline=False,
+            value=f"<@{user_id}> {_when(created_at)}, {status}\n{items}"[:1024]
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@bot.tree.command(name="sales", description="Show sales per day")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(days="How many days back (max 90)", server="Only this server")
+@app_commands.autocomplete(server=server_autocomplete)
+@instrumented
+async def sales_cmd(interaction: discord.Interaction, days: app_commands.Range[int, 1, 90] = 7, server: str = None):
+    since = time.time() - (days - 1) * 86400
+    rows = await storage.run(order_ledger.sales, interaction.guild_id, since, server and server.lower())
+    orders, units, revenue = (sum(row[i] for row in rows) for i in (1, 2, 3))
+    embed = discord.Embed(
+        title=f"💰 Sales, last {days} day(s){f' on {server.title()}' if server else ''}", color=discord.Color.green(),
+        description=f"**{orders}** orders, **{units}** items, **${revenue:.2f}**"
+    )
+    if rows:
+        embed.add_field(name="Per day (UTC)", inline=False, value="\n".join(
+            f"`{day}` {n} orders, {u} items, ${r:.2f}" for day, n, u, r in rows
+        )[:1024])
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@bot.tree.command(name="topitems", description="Show the best selling items")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(days="How many days back (max 365)", server="Only this server", limit="How many items (max 25)")
+@app_commands.autocomplete(server=server_autocomplete)
+@instrumented
+async def topitems_cmd(interaction: discord.Interaction, days: app_commands.Range[int, 1, 365] = 30, server: str = None,
+                       limit: app_commands.Range[int, 1, 25] = 10):
+    since = time.time() - (days - 1) * 86400
+    rows = await storage.run(order_ledger.top_items, interaction.guild_id, since, server and server.lower(), limit)
+    embed = discord.Embed(
+        title=f"🏆 Top items, last {days} day(s){f' on {server.title()}' if server else ''}", color=discord.Color.gold(),
+        description="\n".join(
+            f"**{i}.** {item} ({category}, {srv}): {u} sold in {n} orders, ${r:.2f}"
+            for i, (srv, category, item, n, u, r) in enumerate(rows, 1)
+        )[:4096] or "No sales yet."
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def refresh_lobbies():
+    """Re-render the #shop lobby buttons after the server list changed."""
+    bot.add_view(ServerSelectView(user_id=0))
+    for guild in bot.guilds:
+        stored = await storage.run(session_store.get_shop_message, guild.id)
+        channel = stored and bot.get_channel(stored[0])
+        if channel:
+            try:
+                await outbound.edit(channel.get_partial_message(stored[1]), view=ServerSelectView(user_id=0),
+                                    priority=PRIORITY_BULK)
+            except discord.HTTPException as e:
+                print(f"⚠️ Could not refresh the lobby in {guild.name}: {e}")
+
+
+server_group = app_commands.Group(
+    name="server", description="Manage the game servers the shop sells for",
+    default_permissions=discord.Permissions(administrator=True)
+)
+
+
+@server_group.command(name="add", description="Add a server, or rename an existing one")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(name="Short id used in commands, e.g. 2b2t", label="Name shown on buttons",
+                       file="Inventory JSON file (defaults to <name>_inventory.json)")
+@instrumented
+async def server_add(interaction: discord.Interaction, name: str, label: str = None, file: str = None):
+    error = await server_registry.add(name, label, file)
+    if error:
+        await interaction.response.send_message(f"❌ {error}", ephemeral=True)
+        return
+    name = name.strip().lower()
+    await interaction.response.send_message(
+        f"✅ **{server_registry.label(name)}** (`{name}`) uses `{SERVER_FILES[name]}`.", ephemeral=True
+    )
+    await refresh_lobbies()
+
+
+@server_group.command(name="remove", description="Stop selling for a server (its inventory file is kept)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(name="Server to remove")
+@app_commands.autocomplete(name=server_autocomplete)
+@instrumented
+async def server_remove(interaction: discord.Interaction, name: str):
+    if not await server_registry.remove(name.strip().lower()):
+        await interaction.response.send_message("❌ Invalid server name.", ephemeral=True)
         return
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=4)
+    await interaction.response.send_message(f"🗑️ Removed `{name}` from the shop.", ephemeral=True)
+    await refresh_lobbies()
+
+
+@server_group.command(name="list", description="List the configured servers")
+@app_commands.checks.has_permissions(administrator=True)
+@instrumented
+async def server_list(interaction: discord.Interaction):
+    with _inventory_cache_lock:
+        loaded = set(_inventory_cache)
+    lines = [
+        f"{'🟢' if name in loaded else '⚪'} **{server_registry.label(name)}** (`{name}`) — `{filename}`"
+        for name, filename in SERVER_FILES.items()
+    ]
+    await interaction.response.send_message("\n".join(lines) or "No servers configured.", ephemeral=True)
+
+
+bot.tree.add_command(server_group)
 
 
 class DeleteItemView(discord.ui.View):
     def __init__(self, user_id: int):
         super().__init__(timeout=None)
         self.user_id = user_id
-        for srv in SERVER_FILES.keys():
+        for srv in server_registry.names()[:25]:
             self.add_item(DeleteServerButton(user_id, srv))
 
 class DeleteServerButton(discord.ui.Button):
     def __init__(self, user_id: int, server_name: str):
-        super().__init__(label=server_name.title(), style=discord.ButtonStyle.danger)
+        super().__init__(label=server_registry.label(server_name.lower()), style=discord.ButtonStyle.danger)
         self.user_id = user_id
         self.server = server_name.lower()
 
@@ -837,35 +4923,26 @@ class DeleteServerButton(discord.ui.Button):
             await interaction.response.send_message("You can't use this.", ephemeral=True)
             return
 
-        inventory = load_inventory(self.server)
+        inventory = await storage.load(self.server)
         if not inventory:
             await interaction.response.send_message("⚠️ No inventory found.", ephemeral=True)
             return
 
         await interaction.response.send_message(
             f"📂 Choose a category in **{self.server.title()}**:",
-            view=DeleteCategoryView(self.user_id, self.server),
+            view=DeleteCategoryView(self.user_id, self.server, inventory.keys()),
             ephemeral=True
         )
 
-class DeleteCategoryView(discord.ui.View):
-    def __init__(self, user_id: int, server: str):
-        super().__init__(timeout=None)
-        self.user_id = user_id
-        self.server = server
-        categories = sorted(load_inventory(server).keys())
-        self.add_item(DeleteCategoryDropdown(user_id, server, categories))
+class DeleteCategoryView(ItemPicker):
+    placeholder = "Select category"
 
-class DeleteCategoryDropdown(discord.ui.Select):
-    def __init__(self, user_id: int, server: str, categories: list):
-        self.user_id = user_id
+    def __init__(self, user_id: int, server: str, categories):
         self.server = server
-        options = [discord.SelectOption(label=cat, value=cat) for cat in categories]
-        super().__init__(placeholder="Select category", options=options)
+        super().__init__(user_id, categories)
 
-    async def callback(self, interaction: discord.Interaction):
-        category = self.values[0]
-        inventory = load_inventory(self.server)
+    async def picked(self, interaction: discord.Interaction, category: str):
+        inventory = await storage.load(self.server)
         items = inventory.get(category, {}).keys()
         if not items:
             await interaction.response.send_message("⚠️ No items in this category.", ephemeral=True)
@@ -877,29 +4954,16 @@ class DeleteCategoryDropdown(discord.ui.Select):
             ephemeral=True
         )
 
-class DeleteItemDropdownView(discord.ui.View):
-    def __init__(self, user_id: int, server: str, category: str, items: list):
-        super().__init__(timeout=None)
-        self.add_item(DeleteItemDropdown(user_id, server, category, items))
+class DeleteItemDropdownView(ItemPicker):
+    placeholder = "Select item to delete"
 
-class DeleteItemDropdown(discord.ui.Select):
     def __init__(self, user_id: int, server: str, category: str, items: list):
-        self.user_id = user_id
         self.server = server
         self.category = category
-        options = [discord.SelectOption(label=item, value=item) for item in items]
-        super().__init__(placeholder="Select item to delete", options=options)
-
-    async def callback(self, interaction: discord.Interaction):
-        item = self.values[0]
-        inventory = load_inventory(self.server)
-
-        if item in inventory.get(self.category, {}):
-            del inventory[self.category][item]
-            if not inventory[self.category]:
-                del inventory[self.category]  # Remove empty category
-            save_inventory(self.server, inventory)
+        super().__init__(user_id, items)
 
+    async def picked(self, interaction: discord.Interaction, item: str):
+        if await storage.remove_item(self.server, self.category, item):
             await interaction.response.send_message(
                 f"🗑️ Deleted **{item}** from **{self.category}** in **{self.server.title()}**.",
                 ephemeral=True
@@ -912,6 +4976,7 @@ class DeleteItemDropdown(discord.ui.Select):
 
 @app_commands.command(name="deleteitem", description="Delete an item from the inventory")
 @app_commands.checks.has_permissions(administrator=True)
+@instrumented
 async def delete_item(interaction: discord.Interaction):
     await interaction.response.send_message(
         "🗑️ Select a server to delete an item from:",
@@ -923,7 +4988,17 @@ async def delete_item(interaction: discord.Interaction):
 
 
 
-bot.run("TOKEN")
-
+metrics.gauge("shop_open_carts", lambda: sum(1 for cart in user_carts.values() if cart))
+metrics.gauge("shop_open_shop_channels", lambda: len(user_tickets))
+metrics.gauge("shop_open_tickets", lambda: len(ticket_receipts))
+metrics.gauge("shop_loaded_inventories", lambda: len(_inventory_cache))
+metrics.gauge("shop_ticket_pool_channels", ticket_channels.pooled)
+metrics.gauge("shop_live_catalogs", lambda: len(live_catalogs.messages))
+metrics.gauge("shop_outbound_queue_depth", lambda: {str(shard): outbound.depth(shard) for shard in outbound.lanes}, "shard")
+metrics.gauge("shop_gateway_latency_seconds", lambda: {str(i): s.latency for i, s in bot.shards.items()}, "shard")
+metrics.gauge("shop_shard_guilds", lambda: collections.Counter(str(g.shard_id) for g in bot.guilds), "shard")
+instrument_handlers(globals())
 
 
+if __name__ == "__main__":
+    bot.run(os.getenv("SHOP_BOT_TOKEN", "TOKEN"))
@@ -0,0 +1,379 @@
+"""Drive ShopBot's real callbacks against synthetic inventories and fake Discord objects.
+
+    python benchmarks/bench_callbacks.py
+    python benchmarks/bench_callbacks.py --sizes 1000x100 --iterations 500 --backend sqlite
+
+Each scenario runs in a fresh temp directory with a freshly imported ShopBot,
+so inventory files, shop_state.db and the caches start clean. Nothing talks
+to Discord: every API call lands on a fake object that only counts it.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import importlib
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = "2b2t"
+
+
+def synthetic_inventory(items: int, categories: int, seed: int = 0) -> dict:
+    """Same shape as the shipped *_inventory.json files."""
+    rng = random.Random(seed)
+    names = [f"Category {c}" for c in range(categories)]
+    inventory = {name: {} for name in names}
+    for i in range(items):
+        inventory[names[i % categories]][f"Kit {i:06d}"] = {
+            "price": round(rng.uniform(0.5, 25.0), 2),
+            "stock": 10 ** 6,
+            "image": ""
+        }
+    return inventory
+
+
+def io_counters():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+class ApiCounter:
+    def __init__(self):
+        self.calls = collections.Counter()
+
+    def hit(self, name: str):
+        self.calls[name] += 1
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, channel, content=None, author=None):
+        self.id = next(self._ids)
+        self.channel = channel
+        self.content = content or ""
+        self.author = author
+        self.attachments = []
+        self.embeds = []
+        self.created_at = datetime.datetime.now()
+
+    async def edit(self, **kwargs):
+        self.channel.api.hit("messages.edit")
+
+    async def delete(self):
+        self.channel.api.hit("messages.delete")
+
+
+class FakeChannel:
+    _ids = itertools.count(10 ** 6)
+
+    def __init__(self, api: ApiCounter, guild, name: str):
+        self.api = api
+        self.guild = guild
+        self.id = next(self._ids)
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        self.api.hit("messages.send")
+        message = FakeMessage(self, content, self.guild.me)
+        self.messages.append(message)
+        return message
+
+    async def edit(self, name=None, **kwargs):
+        self.api.hit("channels.edit")
+        self.name = name or self.name
+        return self
+
+    async def delete(self):
+        self.api.hit("channels.delete")
+        self.guild.channels.pop(self.id, None)
+
+    async def history(self, limit=None, oldest_first=False):
+        self.api.hit("messages.history")
+        for message in self.messages:
+            yield message
+
+
+class FakeGuild:
+    def __init__(self, api: ApiCounter):
+        self.api = api
+        self.id = 1
+        self.me = FakeUser(0)
+        self.default_role = object()
+        self.channels = {}
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def get_member(self, user_id: int):
+        return FakeUser(user_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    get_channel_or_thread = get_channel
+
+    async def create_text_channel(self, name: str, **kwargs):
+        self.api.hit("channels.create")
+        channel = FakeChannel(self.api, self, name)
+        self.channels[channel.id] = channel
+        return channel
+
+
+class FakeResponse:
+    def __init__(self, api: ApiCounter):
+        self.api = api
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self, name: str):
+        self.api.hit(name)
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        await self._respond("interaction.send_message")
+
+    async def edit_message(self, *args, **kwargs):
+        await self._respond("interaction.edit_message")
+
+    async def defer(self, *args, **kwargs):
+        await self._respond("interaction.defer")
+
+    async def send_modal(self, modal):
+        await self._respond("interaction.send_modal")
+
+
+class FakeFollowup:
+    def __init__(self, api: ApiCounter):
+        self.api = api
+
+    async def send(self, *args, **kwargs):
+        self.api.hit("interactions.followup")
+
+
+class FakeInteraction:
+    _ids = itertools.count(1)
+
+    def __init__(self, api: ApiCounter, guild: FakeGuild, user_id: int, channel=None):
+        self.id = next(self._ids)
+        self.user = FakeUser(user_id)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel or FakeChannel(api, guild, f"shop-{user_id}")
+        self.message = None
+        self.response = FakeResponse(api)
+        self.followup = FakeFollowup(api)
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Scenario:
+    def __init__(self, shop, inventory: dict, iterations: int, seed: int = 1):
+        self.shop = shop
+        self.inventory = inventory
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        self.api = ApiCounter()
+        self.guild = FakeGuild(self.api)
+        self.categories = list(inventory)
+        self.users = itertools.count(1000)
+        self.results = {}
+
+    def random_item(self):
+        category = self.rng.choice(self.categories)
+        items = self.inventory[category]
+        return category, self.rng.choice(list(items)) if items else None
+
+    def interaction(self, user_id: int, channel=None) -> FakeInteraction:
+        return FakeInteraction(self.api, self.guild, user_id, channel)
+
+    async def fill_cart(self, user_id: int):
+        shop = self.shop
+        key = (self.guild.id, user_id)
+        while key not in shop.user_carts or shop.user_carts[key].total < 5.0:
+            category, item = self.random_item()
+            await shop.add_to_cart(key, SERVER, item, category)
+
+    async def measure(self, name: str, make_call):
+        samples, read, written = [], 0, 0
+        calls = collections.Counter()
+        for _ in range(self.iterations):
+            call = await make_call()  # setup is neither timed nor counted
+            self.api.calls.clear()
+            read0, write0 = io_counters()
+            start = time.perf_counter()
+            await call()
+            samples.append((time.perf_counter() - start) * 1000)
+            read1, write1 = io_counters()
+            read, written = read + read1 - read0, written + write1 - write0
+            calls.update(self.api.calls)
+        self.results[name] = {
+            "p50": percentile(samples, 50), "p90": percentile(samples, 90), "p99": percentile(samples, 99),
+            "max": max(samples), "mean": statistics.fmean(samples),
+            "read_kb": read / 1024 / self.iterations,
+            "write_kb": written / 1024 / self.iterations,
+            "api": dict(calls)
+        }
+
+    async def run(self):
+        shop = self.shop
+
+        async def category_click():
+            user_id = next(self.users)
+            category = self.rng.choice(self.categories)
+            button = shop.CategoryButton(user_id, SERVER, category, None)
+            return lambda: button.callback(self.interaction(user_id))
+
+        async def add_to_cart():
+            user_id = next(self.users)
+            category, item = self.random_item()
+            return lambda: shop.add_to_cart((self.guild.id, user_id), SERVER, item, category)
+
+        async def view_cart():
+            user_id = next(self.users)
+            await self.fill_cart(user_id)
+            return lambda: shop.ViewCartButton(user_id).callback(self.interaction(user_id))
+
+        async def confirm_order():
+            user_id = next(self.users)
+            await self.fill_cart(user_id)
+            channel = await self.guild.create_text_channel(f"shop-{user_id}")
+            shop.user_tickets[(self.guild.id, user_id)] = channel.id
+            return lambda: shop.ConfirmOrderButton(user_id).callback(self.interaction(user_id, channel))
+
+        async def add_item():
+            modal = shop.AddItemModal(SERVER)
+            n = next(self.users)
+            modal.category._value = self.rng.choice(self.categories)
+            modal.item_name._value = f"Bench Item {n}"
+            modal.price._value = "2.5"
+            modal.stock._value = "10"
+            modal.image_url._value = ""
+            return lambda: modal.on_submit(self.interaction(n))
+
+        async def edit_pick():
+            user_id = next(self.users)
+            category, item = self.random_item()
+            names = list((await shop.storage.load(SERVER)).get(category, {}))
+            picker = shop.EditItemNameSelectView(user_id, SERVER, category, names)
+            return lambda: picker.picked(self.interaction(user_id), item)
+
+        async def edit_submit():
+            category, item = self.random_item()
+            info = (await shop.storage.load(SERVER))[category][item]
+            modal = shop.EditItemModal(SERVER, category, item, info)
+            modal.price._value = str(round(self.rng.uniform(0.5, 25.0), 2))
+            return lambda: modal.on_submit(self.interaction(next(self.users)))
+
+        async def delete_item():
+            user_id = next(self.users)
+            category, item = self.random_item()
+            self.inventory[category].pop(item, None)
+            names = list((await shop.storage.load(SERVER)).get(category, {}))
+            picker = shop.DeleteItemDropdownView(user_id, SERVER, category, names)
+            return lambda: picker.picked(self.interaction(user_id), item)
+
+        await self.measure("CategoryButton.callback", category_click)
+        await self.measure("add_to_cart", add_to_cart)
+        await self.measure("ViewCartButton.callback", view_cart)
+        await self.measure("ConfirmOrderButton.callback", confirm_order)
+        await self.measure("AddItemModal.on_submit", add_item)
+        await self.measure("EditItemNameSelectView.picked", edit_pick)
+        await self.measure("EditItemModal.on_submit", edit_submit)
+        await self.measure("DeleteItemDropdownView.picked", delete_item)
+        return self.results
+
+
+def load_shop(workdir: str, backend: str):
+    os.environ["SHOP_INVENTORY_BACKEND"] = backend
+    os.environ["SHOP_INVENTORY_DB"] = os.path.join(workdir, "inventory.db")
+    os.environ["SHOP_SESSION_DB"] = os.path.join(workdir, "shop_state.db")
+    os.environ["SHOP_IMAGE_CACHE_DIR"] = os.path.join(workdir, "image_cache")
+    os.chdir(workdir)
+    if REPO not in sys.path:
+        sys.path.insert(0, REPO)
+    sys.modules.pop("ShopBot", None)
+    shop = importlib.import_module("ShopBot")
+    # Count calls instead of pacing them: the fake API has no rate limits.
+    shop.outbound.limits = {route: (10 ** 9, 1.0) for route in shop.OUTBOUND_LIMITS}
+    return shop
+
+
+async def run_scenario(items: int, categories: int, iterations: int, backend: str) -> dict:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="shopbench-") as workdir:
+        inventory = synthetic_inventory(items, categories)
+        with open(os.path.join(workdir, "2b2t_inventory.json"), "w") as f:
+            json.dump(inventory, f)
+        with open(os.path.join(workdir, "constantiam_inventory.json"), "w") as f:
+            json.dump(synthetic_inventory(10, 5), f)
+        try:
+            shop = load_shop(workdir, backend)
+            results = await Scenario(shop, inventory, iterations).run()
+            shop.storage.executor.shutdown(wait=True)
+            return results
+        finally:
+            os.chdir(cwd)
+
+
+def report(items: int, categories: int, results: dict):
+    print(f"\n=== {items} items / {categories} categories ===")
+    print(f"{'callback':32} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'rKB/op':>8} {'wKB/op':>8}  api calls")
+    for name, r in results.items():
+        api = ", ".join(f"{k}={v}" for k, v in sorted(r["api"].items()))
+        print(f"{name:32} {r['p50']:8.2f} {r['p90']:8.2f} {r['p99']:8.2f} {r['max']:8.2f} "
+              f"{r['read_kb']:8.1f} {r['write_kb']:8.1f}  {api}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10x5,1000x100,50000x100",
+                        help="comma separated ITEMSxCATEGORIES scenarios")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--json", dest="json_out", help="also write the raw results to this file")
+    args = parser.parse_args()
+
+    everything = {}
+    for size in args.sizes.split(","):
+        items, categories = (int(n) for n in size.lower().split("x"))
+        results = asyncio.run(run_scenario(items, categories, args.iterations, args.backend))
+        report(items, categories, results)
+        everything[size] = results
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(everything, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def shop(tmp_path, monkeypatch):
+    """A freshly imported ShopBot whose databases, inventories and caches live in tmp_path."""
+    monkeypatch.setenv("SHOP_INVENTORY_DB", str(tmp_path / "inventory.db"))
+    monkeypatch.setenv("SHOP_SESSION_DB", str(tmp_path / "shop_state.db"))
+    monkeypatch.setenv("SHOP_LEDGER_DB", str(tmp_path / "orders.db"))
+    monkeypatch.setenv("SHOP_IMAGE_CACHE_DIR", str(tmp_path / "image_cache"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(REPO)
+    sys.modules.pop("ShopBot", None)
+    module = importlib.import_module("ShopBot")
+    yield module
+    module.storage.executor.shutdown(wait=True)
+    sys.modules.pop("ShopBot", None)
@@ -0,0 +1,107 @@
+"""Just enough of discord.py's objects to drive ShopBot's callbacks without Discord."""
+import itertools
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, channel, content=None, **kwargs):
+        self.id = next(self._ids)
+        self.channel = channel
+        self.content = content or ""
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.kwargs.update(kwargs)
+
+
+class FakeChannel:
+    _ids = itertools.count(10 ** 6)
+
+    def __init__(self, guild, name: str):
+        self.guild = guild
+        self.id = next(self._ids)
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(self, content, **kwargs)
+        self.messages.append(message)
+        return message
+
+    async def edit(self, name=None, **kwargs):
+        self.name = name or self.name
+        return self
+
+    async def delete(self):
+        self.guild.channels.pop(self.id, None)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = 1):
+        self.id = guild_id
+        self.me = FakeUser(0)
+        self.default_role = object()
+        self.channels = {}
+
+    def get_member(self, user_id: int):
+        return FakeUser(user_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    get_channel_or_thread = get_channel
+
+    async def create_text_channel(self, name: str, **kwargs):
+        channel = FakeChannel(self, name)
+        self.channels[channel.id] = channel
+        return channel
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+        self.sent = []
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(content)
+        self.done = True
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeInteraction:
+    _ids = itertools.count(1)
+
+    def __init__(self, guild: FakeGuild, user_id: int, channel=None):
+        self.id = next(self._ids)
+        self.user = FakeUser(user_id)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.message = None
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
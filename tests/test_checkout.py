@@ -0,0 +1,81 @@
+"""ConfirmOrderButton against fake Discord objects."""
+import asyncio
+import json
+
+from fakes import FakeGuild, FakeInteraction
+
+SERVER = "2b2t"
+
+
+def test_double_confirm_places_one_order(shop, tmp_path):
+    with open(tmp_path / shop.SERVER_FILES[SERVER], "w") as f:
+        json.dump({"Kits": {"Sword": {"price": 6.0, "stock": 2, "image": ""}}}, f)
+    shop.outbound.limits = {route: (10 ** 9, 1.0) for route in shop.OUTBOUND_LIMITS}
+
+    async def scenario():
+        guild = FakeGuild()
+        user_id = 42
+        key = (guild.id, user_id)
+        assert await shop.add_to_cart(key, SERVER, "Sword", "Kits")
+        channel = await guild.create_text_channel(f"shop-{user_id}")
+        shop.user_tickets[key] = channel.id
+
+        button = shop.ConfirmOrderButton(user_id)
+        first, second = FakeInteraction(guild, user_id, channel), FakeInteraction(guild, user_id, channel)
+        await asyncio.gather(button.callback(first), button.callback(second))
+
+        assert second.response.sent == ["🛒 Nothing to confirm."]
+        assert (await shop.storage.load(SERVER))["Kits"]["Sword"]["stock"] == 1
+        orders = await shop.storage.run(shop.order_ledger.orders, guild.id)
+        assert [(units, total) for _, _, _, units, total, *_ in orders] == [(1, 6.0)]
+        assert not shop.user_carts.get(key)
+
+    asyncio.run(scenario())
+
+
+def test_failed_confirm_keeps_the_cart(shop, tmp_path):
+    with open(tmp_path / shop.SERVER_FILES[SERVER], "w") as f:
+        json.dump({"Kits": {"Apple": {"price": 1.0, "stock": 5, "image": ""}}}, f)
+
+    async def scenario():
+        guild = FakeGuild()
+        key = (guild.id, 7)
+        assert await shop.add_to_cart(key, SERVER, "Apple", "Kits")
+        interaction = FakeInteraction(guild, 7)
+        await shop.ConfirmOrderButton(7).callback(interaction)
+
+        assert interaction.response.sent == ["⚠️ The minimum order is $5.00. Your cart total is $1.00."]
+        assert shop.user_carts[key].quantities() == {("Kits", "Apple"): 1}
+
+    asyncio.run(scenario())
+
+
+def test_prune_keeps_locks_that_are_waited_on(shop):
+    reservations = shop.StockReservations(ttl=60)
+    key = (SERVER, "Kits", "Sword")
+
+    async def scenario():
+        inside = []
+
+        async def use(name):
+            async with reservations._locked([key]):
+                inside.append(name)
+                await asyncio.sleep(0.01)
+                inside.remove(name)
+
+        first = asyncio.ensure_future(use("first"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(use("second"))
+        await asyncio.sleep(0)
+        await reservations.prune()
+        assert key in reservations.locks
+        third = asyncio.ensure_future(use("third"))
+        for _ in range(5):
+            await asyncio.sleep(0.002)
+            assert len(inside) <= 1
+        await asyncio.gather(first, second, third)
+
+        await reservations.prune()
+        assert reservations.locks == {} and reservations.users == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+"""ImageCache against a local aiohttp server standing in for Discord's CDN."""
+import asyncio
+import hashlib
+import os
+import time
+
+from aiohttp import web
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+async def serve(hits: dict):
+    async def image(request):
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.path == "/gone.png":
+            return web.Response(status=404)
+        await asyncio.sleep(0.05)  # keep the download in flight while a second fetch arrives
+        return web.Response(body=PNG, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/{name}", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_image_cache(shop, tmp_path):
+    async def scenario():
+        hits = {}
+        runner, base = await serve(hits)
+        cache = shop.ImageCache(str(tmp_path / "images"), 2)
+        try:
+            live = hex(int(time.time()) + 3600)[2:]
+            past = hex(int(time.time()) - 3600)[2:]
+            first = f"{base}/sword.png?ex={live}&is=0&hm=aa"
+            second = f"{base}/copy.png"
+
+            # Download, with concurrent fetches of one URL sharing one request
+            paths = await asyncio.gather(cache.fetch(first), cache.fetch(first))
+            assert paths[0] == paths[1]
+            assert hits["/sword.png"] == 1
+            name = hashlib.sha256(PNG).hexdigest() + ".png"
+            assert os.path.basename(paths[0]) == name
+            with open(paths[0], "rb") as f:
+                assert f.read() == PNG
+
+            # Identical bytes under another URL are stored once
+            assert await cache.fetch(second) == paths[0]
+            assert sorted(os.listdir(cache.directory)) == sorted([name, "index.json"])
+            assert cache.index == {
+                cache.url_key(first): name,
+                cache.url_key(second): name,
+            }
+
+            # A cached URL is not downloaded again, even with a fresh ex/is/hm signature
+            assert await cache.fetch(f"{base}/sword.png?ex={past}&is=1&hm=bb") == paths[0]
+            assert hits["/sword.png"] == 1
+
+            # Live links are left alone, expired ones are served from the cache
+            files = []
+            assert cache.attach(first, files) == first
+            assert files == []
+            expired = f"{base}/sword.png?ex={past}&is=0&hm=aa"
+            assert cache.attach(expired, files) == f"attachment://{name}"
+            assert cache.attach(expired, files) == f"attachment://{name}"
+            assert [f.filename for f in files] == [name]
+
+            # A 404 marks the link broken; with nothing cached the URL is kept
+            gone = f"{base}/gone.png"
+            assert await cache.fetch(gone) is None
+            assert cache.url_key(gone) in cache.broken
+            files = []
+            assert cache.attach(gone, files) == gone
+            assert files == []
+
+            # A broken link that was cached earlier is served from the cache
+            cache.broken.add(cache.url_key(second))
+            assert cache.attach(second, files) == f"attachment://{name}"
+
+            # The index survives a restart
+            assert shop.ImageCache(cache.directory, 2).path(first) == paths[0]
+
+            assert await cache.validate([first, second, gone]) == (2, 3)
+        finally:
+            await cache.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
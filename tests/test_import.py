@@ -0,0 +1,41 @@
+"""Catalog import while checkouts hold item locks."""
+import asyncio
+import json
+
+from fakes import FakeGuild, FakeInteraction
+
+SERVER = "2b2t"
+
+
+def test_import_waits_for_checkout_locks(shop, tmp_path):
+    with open(tmp_path / shop.SERVER_FILES[SERVER], "w") as f:
+        json.dump({"Kits": {"Sword": {"price": 6.0, "stock": 5, "image": ""},
+                            "Shield": {"price": 3.0, "stock": 5, "image": ""}}}, f)
+    rows = {("Kits", "Sword"): {"price": 7.0, "stock": 10, "image": ""}}
+
+    async def scenario():
+        checkout = asyncio.Event()
+        release = asyncio.Event()
+
+        async def sell_shield():
+            # An unrelated item is still rewritten by the import, so it has to wait for this too.
+            async with shop.reservations._locked([(SERVER, "Kits", "Shield")]):
+                checkout.set()
+                await release.wait()
+                await shop.storage.adjust_stock(SERVER, "Kits", "Shield", -1)
+
+        seller = asyncio.ensure_future(sell_shield())
+        await checkout.wait()
+        view = shop.ImportCatalogView(1, SERVER, rows, False)
+        interaction = FakeInteraction(FakeGuild(), 1)
+        importer = asyncio.ensure_future(shop.ImportCatalogView.apply(view, interaction, None))
+        await asyncio.sleep(0.05)
+        assert (await shop.storage.load(SERVER))["Kits"]["Sword"]["stock"] == 5
+
+        release.set()
+        await asyncio.gather(seller, importer)
+        inventory = await shop.storage.load(SERVER)
+        assert inventory["Kits"]["Sword"] == {"price": 7.0, "stock": 10, "image": ""}
+        assert inventory["Kits"]["Shield"]["stock"] == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+"""Cached catalog pages and item embeds."""
+import asyncio
+import json
+import time
+
+SERVER = "2b2t"
+
+
+def test_catalog_page_serves_cached_image_once_link_expires(shop, tmp_path, monkeypatch):
+    ex = hex(int(time.time()) + 60)[2:]
+    url = f"https://cdn.example/x.png?ex={ex}&is=0&hm=aa"
+    with open(tmp_path / shop.SERVER_FILES[SERVER], "w") as f:
+        json.dump({"Kits": {"Sword": {"price": 6.0, "stock": 2, "image": url}}}, f)
+    shop.image_cache._store(shop.ImageCache.url_key(url), "abc.png", b"png")
+
+    async def scenario():
+        source = (await shop.storage.load(SERVER))["Kits"]
+        items = shop.in_stock(source, SERVER, "Kits")
+        embeds, files = shop.CatalogView(1, SERVER, "Kits", items).render(source)
+        assert embeds[0].image.url == url and files == []
+        assert shop.CatalogView(1, SERVER, "Kits", items).render(source)[0] is embeds
+
+        later = time.time() + 120
+        monkeypatch.setattr(shop.time, "time", lambda: later)
+        embeds, files = shop.CatalogView(1, SERVER, "Kits", items).render(source)
+        assert embeds[0].image.url == "attachment://abc.png"
+        assert [f.filename for f in files] == ["abc.png"]
+
+    asyncio.run(scenario())
+
+
+def test_item_embed_is_cached_per_category(shop):
+    info = {"price": 1.0, "stock": 1, "image": ""}
+    first = shop.item_embed("Sword", info, server=SERVER, category="Kits")
+    assert shop.item_embed("Sword", info, server=SERVER, category="Kits") is first
+    assert shop.item_embed("Sword", info, server=SERVER, category="Weapons") is not first
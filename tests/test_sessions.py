@@ -0,0 +1,32 @@
+"""The session reaper's soft size cap."""
+import asyncio
+import datetime
+
+import discord
+
+from fakes import FakeGuild
+
+
+def test_session_cap_is_soft_for_open_shop_channels(shop, monkeypatch):
+    monkeypatch.setattr(shop, "SESSION_MAX", 2)
+    monkeypatch.setattr(type(shop.bot), "shards", property(lambda self: {0: None}))
+    guild = FakeGuild()
+    monkeypatch.setattr(shop.bot, "get_guild", lambda guild_id: guild)
+
+    async def scenario():
+        # Two shoppers without a shop channel, then four whose channels are still talked in.
+        for user_id in (1, 2):
+            shop.user_carts[(guild.id, user_id)] = shop.Cart("2b2t")
+        for user_id in (3, 4, 5, 6):
+            channel = await guild.create_text_channel(f"shop-{user_id}")
+            channel.last_message_id = discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+            shop.user_tickets[(guild.id, user_id)] = channel.id
+            shop.user_carts[(guild.id, user_id)] = shop.Cart("2b2t")
+
+        await shop.reap_sessions()
+
+        assert set(shop.user_carts) == {(guild.id, user_id) for user_id in (3, 4, 5, 6)}
+        assert len(shop.user_tickets) == 4 > shop.SESSION_MAX
+        assert len(guild.channels) == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+"""SQLite transactions under a competing writer."""
+import sqlite3
+import threading
+
+import pytest
+
+
+def test_failed_begin_releases_the_store_lock(shop, tmp_path):
+    store = shop.session_store
+    store.conn.execute("PRAGMA busy_timeout = 0")
+    blocker = sqlite3.connect(store.path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with store.transaction():
+                pass
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+    # Another thread must be able to take the lock now.
+    acquired = []
+
+    def take():
+        acquired.append(store.lock.acquire(timeout=1))
+        if acquired[-1]:
+            store.lock.release()
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    thread.join()
+    assert acquired == [True]
+    with store.transaction() as conn:
+        conn.execute("SELECT 1")
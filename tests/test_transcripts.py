@@ -0,0 +1,44 @@
+"""TranscriptExport's in-memory buffer and its size cap."""
+import asyncio
+import datetime
+import gzip
+import io
+
+from fakes import FakeChannel, FakeGuild, FakeUser
+
+
+def history(count: int) -> FakeChannel:
+    channel = FakeChannel(FakeGuild(), "ticket-1")
+    for i in range(count):
+        channel.messages.append(type("Message", (), {
+            "id": i, "author": FakeUser(5), "content": f"message {i} " + "x" * 100,
+            "attachments": [], "embeds": [], "created_at": datetime.datetime(2026, 1, 1)
+        })())
+
+    async def read(limit=None, oldest_first=False):
+        for msg in channel.messages:
+            yield msg
+
+    channel.history = read
+    return channel
+
+
+def test_transcript_is_capped_in_memory(shop, monkeypatch):
+    monkeypatch.setattr(shop, "TRANSCRIPT_CHUNK_BYTES", 1024)
+    monkeypatch.setattr(shop, "TRANSCRIPT_MAX_BYTES", 8 * 1024)
+
+    async def scenario():
+        transcript = shop.TranscriptExport(history(1000))
+        await transcript.run()
+        assert isinstance(transcript.buffer, io.BytesIO)
+        assert transcript.truncated and transcript.count < 1000
+        text = transcript.buffer.getvalue().decode()
+        assert len(text.encode()) < 10 * 1024
+        assert text.endswith(f"Transcript cut off after {transcript.count} messages.\n")
+
+        full = shop.TranscriptExport(history(20), "jsonl", compress=True)
+        await full.run()
+        assert not full.truncated and full.count == 20
+        assert len(gzip.decompress(full.buffer.getvalue()).splitlines()) == 20
+
+    asyncio.run(scenario())